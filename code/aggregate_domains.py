@@ -1,28 +1,44 @@
-import json, argparse, pandas as pd, pathlib, re, numpy as np
+import os
+if os.environ.get("CUDF") == "1":
+    try:
+        import cudf.pandas
+        cudf.pandas.install()
+    except ImportError:
+        print("cudf not available, running on CPU")
+import argparse, pandas as pd, pathlib, re, numpy as np, orjson
+import pyarrow as pa, pyarrow.compute as pc, pyarrow.csv as pa_csv, pyarrow.json as pa_json
 
 def load_docs(path):
-    with open(path, encoding="utf-8") as f:
-        return [json.loads(line) for line in f]
+    return [orjson.loads(line) for line in pathlib.Path(path).read_bytes().splitlines() if line.strip()]
 
 def rights_count(details):
     r = details.get("rights", {}) if isinstance(details, dict) else {}
     return sum(1 for v in r.values() if v is True)
 
 def load_ndjson(path: str) -> pd.DataFrame:
-    with open(path, encoding="utf-8") as f:
-        records = [json.loads(line) for line in f if line.strip()]
-
-    df = pd.json_normalize(records, sep=".")
-    return df
-
-def norm_domain(s):
-    if not isinstance(s, str):
-        return s
-    s = s.strip().lower()
-    s = re.sub(r"^https?://", "", s)
-    s = s.split("/")[0]
-    s = s[4:] if s.startswith("www.") else s
-    return s
+    table = pa_json.read_json(path)
+    cols = {}
+    for name in FIELDS:
+        head, *rest = name.split(".")
+        if head not in table.column_names:
+            continue
+        arr = table.column(head)
+        for key in rest:
+            if not pa.types.is_struct(arr.type) or arr.type.get_field_index(key) < 0:
+                arr = None
+                break
+            arr = pc.struct_field(arr, key)
+        if arr is not None:
+            cols[name] = arr
+    return pa.table(cols).to_pandas()
+
+_SCHEME_RX = re.compile(r"^https?://")
+
+def _norm_domain_series(s: pd.Series) -> pd.Series:
+    return (s.str.strip().str.lower()
+             .str.replace(_SCHEME_RX, "", regex=True)
+             .str.split("/", n=1).str[0]
+             .str.removeprefix("www."))
 
 RIGHT_COLS = [
     "details.rights.access",
@@ -34,98 +50,117 @@ RIGHT_COLS = [
     "details.rights.no_individual_decision",
 ]
 
+FIELDS = [
+    "domain", "doc_type", "sha1", "url",
+    "details.controller", "details.dpo_contact", "details.retention",
+    "details.legal_bases", "details.recipients", "details.third_parties",
+    "details.transfer_scope", "details.consent_mechanism", "details.ownership",
+    "details.rights_general_statement", "details.automated_decisions",
+    "details.complaint_authority", "details.mgmt_instructions",
+    "details.ip_notice", "details.liability_clause",
+    *RIGHT_COLS,
+]
+
+def _list_len(s: pd.Series) -> pd.Series:
+    return s.map(len, na_action="ignore").fillna(0).astype("int32")
+
+BOOL_COLS = [
+    "has_privacy", "has_cookies", "has_legal", "has_data_prot",
+    "privacy_controller_present", "dpo_contact_present",
+    "rights_general_statement", "automated_decisions_present",
+    "retention_present", "complaint_authority_present",
+    "cookie_mgmt_instructions", "cookie_ownership_mixed_doc",
+    "legal_ip_notice_present", "legal_liability_present",
+]
+
 SCOPE_RANK = {"NONE": 0, "INTRA_EU": 1, "INTERNATIONAL": 2}
 
-def norm_scope(raw):
-    if not isinstance(raw, str):
-        return None
-    raw = raw.upper()
-    if re.search(r"INTERNAC", raw):
-        return "INTERNATIONAL"
-    if re.search(r"INTRA|UE|EEE", raw):
-        return "INTRA_EU"
-    if re.search(r"NONE|NINGUNA", raw):
-        return "NONE"
-    return None
+SCOPE_RX = [
+    ("INTERNATIONAL", re.compile(r"INTERNAC")),
+    ("INTRA_EU",      re.compile(r"INTRA|UE|EEE")),
+    ("NONE",          re.compile(r"NONE|NINGUNA")),
+]
+
+def norm_scope_series(s: pd.Series) -> pd.Series:
+    u = s.astype("string").str.upper()
+    conds = [u.str.contains(rx, na=False).to_numpy(dtype=bool) for _, rx in SCOPE_RX]
+    labels = np.select(conds, [label for label, _ in SCOPE_RX], default=None)
+    return pd.Series(labels, index=s.index, dtype=object)
 
 def main(src, dst):
     df = load_ndjson(src).drop_duplicates(subset=["domain", "doc_type", "sha1"])
-    df["domain"] = df["domain"].apply(norm_domain)
+    df["domain"] = _norm_domain_series(df["domain"]).astype("category")
 
+    n = len(df.index)
     def S(col, default=pd.NA):
         if col in df.columns:
             return df[col]
-        n = len(df.index)
         if callable(default):
-            vals = [default() for _ in range(n)]
-        else:
-            vals = [default] * n
-        return pd.Series(vals, index=df.index)
-
-    df["has_privacy"]  = df["doc_type"].eq("PRIVACY_POLICY")
-    df["has_cookies"]  = df["doc_type"].eq("COOKIE_POLICY")
+            return pd.Series([default() for _ in range(n)], index=df.index)
+        if default is False:
+            return pd.Series(np.zeros(n, dtype=bool), index=df.index)
+        return pd.Series(np.full(n, default, dtype=object), index=df.index)
+
+    is_privacy = df["doc_type"].eq("PRIVACY_POLICY")
+    is_cookies = df["doc_type"].eq("COOKIE_POLICY")
+    is_data_prot = df["doc_type"].eq("DATA_PROTECTION")
+    is_rights_doc = is_privacy | is_data_prot
+
+    df["has_privacy"]  = is_privacy
+    df["has_cookies"]  = is_cookies
     df["has_legal"]    = df["doc_type"].eq("LEGAL_NOTICE")
-    df["has_data_prot"]= df["doc_type"].eq("DATA_PROTECTION")
+    df["has_data_prot"]= is_data_prot
 
     df["privacy_controller_present"] = (
-        (df["doc_type"]=="PRIVACY_POLICY") & S("details.controller", "").astype(str).str.len().gt(0)
+        is_privacy & S("details.controller", "").astype(str).str.len().gt(0)
     )
     df["dpo_contact_present"] = S("details.dpo_contact", "").astype(str).str.len().gt(0)
 
-    for c in RIGHT_COLS:
-        if c not in df.columns:
-            df[c] = pd.NA
-    df["rights_count"] = df[RIGHT_COLS].fillna(False).astype("boolean").sum(axis=1)
-    df["rights_count_rel"] = df["rights_count"].where(
-        df["doc_type"].isin(["PRIVACY_POLICY", "DATA_PROTECTION"])
-    )
+    rights = df.reindex(columns=RIGHT_COLS).eq(True).to_numpy()
+    df["rights_count"] = pd.array(rights.sum(axis=1, dtype=np.int8), dtype="Int8")
+    df["rights_count_rel"] = df["rights_count"].where(is_rights_doc)
     df["legal_bases_count"] = (
-        S("details.legal_bases", list)
-        .apply(lambda x: len(x) if isinstance(x, list) else 0)
-        .where(df["doc_type"].eq("PRIVACY_POLICY"), 0)
+        _list_len(S("details.legal_bases", list))
+        .where(is_privacy, 0)
     )
 
-    df["scope_norm"] = S("details.transfer_scope", None).apply(norm_scope)
+    df["scope_norm"] = norm_scope_series(S("details.transfer_scope", None))
     df["transfer_rank"] = (
         df["scope_norm"]
         .map(SCOPE_RANK)
-        .where(df["doc_type"].isin(["PRIVACY_POLICY", "DATA_PROTECTION"]))
-    )
-    df["consent_mechanism_doc"] = df.apply(
-        lambda r: r["details.consent_mechanism"] if r["doc_type"]=="COOKIE_POLICY" else None,
-        axis=1
+        .where(is_rights_doc)
     )
+    df["consent_mechanism_doc"] = S("details.consent_mechanism", None).where(is_cookies)
 
     df["rights_general_statement"] = S("details.rights_general_statement", False).fillna(False).astype("boolean")
     df["automated_decisions_present"] = S("details.automated_decisions", False).fillna(False).astype("boolean")
     df["retention_present"] = S("details.retention", "").astype(str).str.len().gt(0)
 
     df["recipients_count"] = (
-        S("details.recipients", list)
-        .apply(lambda x: len(x) if isinstance(x, list) else 0)
-        .where(df["doc_type"].isin(["PRIVACY_POLICY", "DATA_PROTECTION"]), 0)
+        _list_len(S("details.recipients", list))
+        .where(is_rights_doc, 0)
     )
 
     df["complaint_authority_present"] = S("details.complaint_authority", False).fillna(False).astype("boolean")
 
     df["cookie_third_party_count"] = (
-        S("details.third_parties", list)
-        .apply(lambda x: len(x) if isinstance(x, list) else 0)
-        .where(df["doc_type"].eq("COOKIE_POLICY"), 0)
+        _list_len(S("details.third_parties", list))
+        .where(is_cookies, 0)
     )
     df["cookie_mgmt_instructions"] = S("details.mgmt_instructions", False).fillna(False).astype("boolean")
 
     df["cookie_ownership_mixed_doc"] = np.where(
-        df["doc_type"].eq("COOKIE_POLICY"),
+        is_cookies,
         S("details.ownership", None).eq("MIXED"),
         False
     )
 
     df["legal_ip_notice_present"]   = S("details.ip_notice", False).fillna(False).astype("boolean")
     df["legal_liability_present"]   = S("details.liability_clause", False).fillna(False).astype("boolean")
+    df[BOOL_COLS] = df[BOOL_COLS].astype("uint8")
 
     agg_dom = (
-        df.groupby("domain")
+        df.groupby("domain", observed=True)
           .agg(
               docs                      = ("url", "count"),
               has_privacy               = ("has_privacy", "max"),
@@ -151,6 +186,9 @@ def main(src, dst):
           )
           .reset_index()
     )
+    agg_dom["domain"] = agg_dom["domain"].astype(str)
+    flags = agg_dom.select_dtypes("uint8").columns
+    agg_dom[flags] = agg_dom[flags].astype(bool)
 
     rank_to_scope = {v: k for k, v in SCOPE_RANK.items()}
     agg_dom["transfer_scope"] = agg_dom["max_transfer_scope_rank"].map(rank_to_scope)
@@ -163,7 +201,7 @@ def main(src, dst):
     agg_dom["consent_mechanism"] = agg_dom["domain"].map(consent)
 
     agg_dom.replace({"": pd.NA, "null": pd.NA}, inplace=True)
-    agg_dom.to_csv(dst, index=False)
+    pa_csv.write_csv(pa.Table.from_pandas(agg_dom, preserve_index=False), dst)
     print("Saved", dst)
 
 if __name__ == "__main__":
@@ -1,23 +1,26 @@
 from __future__ import annotations
 
-import argparse, hashlib, json, os, sys, time, re, random
+import argparse, functools, hashlib, json, os, sqlite3, sys, time, re, random
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 from typing import List, Optional, Dict
 
+import orjson
 import requests
-from bs4 import BeautifulSoup
-from langdetect import detect
-from pydantic import BaseModel, Field, ValidationError
+import lxml.html
+from lxml import etree
+from pydantic import BaseModel, Field, PrivateAttr, TypeAdapter, ValidationError
 import re, itertools, urllib.parse as ul
 
-from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
+from playwright.async_api import async_playwright, TimeoutError as PWTimeout
 
-import threading, collections, time as _time
+import asyncio, atexit, threading, collections, time as _time
 
 from google import genai as genai
 
 _SILENCE_PAT = re.compile(r"^\s*(no\s+se\s+menciona|no\s+aplica|n/?a|not\s+mentioned|unspecified)\s*\.?$", re.I)
+_SILENCE_WORDS = frozenset(w + dot for w in ("no se menciona", "no aplica", "na", "n/a", "not mentioned", "unspecified")
+                           for dot in ("", "."))
 
 UA = (
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -27,41 +30,50 @@ UA = (
 CHUNK_TOKENS = 2000
 CHUNK_OVERLAP = 250
 MAX_RETRIES_LLM = 5
+RENDER_CONCURRENCY = 12
+BATCH_MAX_WORDS = 30000
+CHUNK_CONCURRENCY = 4
+FSYNC_EVERY = 50
+
+_SHA_RE = re.compile(rb'"sha1"\s*:\s*"([0-9a-f]{40})"')
+_URL_RE = re.compile(rb'"url"\s*:\s*"([^"]+)"')
 
 def load_done_hashes(path: Path) -> set[str]:
     done = set()
     if not path.exists():
         return done
-    with path.open(encoding="utf-8") as f:
+    with path.open("rb") as f:
         for ln in f:
             ln = ln.strip()
-            if not ln:
+            if not ln.endswith(b"}"):
                 continue
-            try:
-                rec = json.loads(ln)
-            except json.JSONDecodeError:
+            m = _SHA_RE.search(ln)
+            if m:
+                done.add(m.group(1).decode())
                 continue
-            h = rec.get("sha1")
-            if not h and "url" in rec:
-                h = hashlib.sha1(rec["url"].encode()).hexdigest()
-            if h:
-                done.add(h)
+            m = _URL_RE.search(ln)
+            if m:
+                done.add(hashlib.sha1(m.group(1)).hexdigest())
     return done
 
 def link_hash(link) -> str:
     return hashlib.sha1(link.url.encode()).hexdigest()
 
+_JSON_TOKENS = re.compile(r'[{}"\\]')
+
 def find_balanced_json(s: str) -> str:
     start = s.find("{")
     if start == -1:
         raise ValueError("No JSON object found")
-    depth, in_str, esc = 0, False, False
-    for i, ch in enumerate(s[start:], start):
+    depth, in_str, escaped = 0, False, -1
+    for m in _JSON_TOKENS.finditer(s, start):
+        i = m.start()
+        if i == escaped:
+            continue
+        ch = s[i]
         if in_str:
-            if esc:
-                esc = False
-            elif ch == "\\":
-                esc = True
+            if ch == "\\":
+                escaped = i + 1
             elif ch == '"':
                 in_str = False
         else:
@@ -75,17 +87,95 @@ def find_balanced_json(s: str) -> str:
                     return s[start:i+1]
     raise ValueError("Unbalanced JSON")
 
-def gemini_json(model_name: str, prompt: str, schema: dict) -> dict:
-    client = genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
+LLM_CACHE = ""  # SQLite path, set from --cache (default: next to --output)
+_cache_db: sqlite3.Connection | None = None
+_cache_lock = threading.Lock()
+
+def _cache_conn() -> sqlite3.Connection:
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = sqlite3.connect(LLM_CACHE, check_same_thread=False)
+        _cache_db.execute("CREATE TABLE IF NOT EXISTS exact (key TEXT PRIMARY KEY, response TEXT)")
+    return _cache_db
+
+def cache_get(key: str):
+    with _cache_lock:
+        row = _cache_conn().execute("SELECT response FROM exact WHERE key=?", (key,)).fetchone()
+    return orjson.loads(row[0]) if row else None
+
+def cache_put(key: str, value) -> None:
+    with _cache_lock:
+        db = _cache_conn()
+        db.execute("INSERT OR REPLACE INTO exact VALUES (?, ?)", (key, orjson.dumps(value)))
+        db.commit()
+
+def cached_llm(fn):
+    @functools.wraps(fn)
+    def wrapper(model_name: str, prompt: str, schema: dict, prefix: str = "",
+                lim: "RateLimiter | None" = None, valid=None) -> dict:
+        def call():
+            # only real API calls count against the rate limit, cache hits are free
+            if lim is not None:
+                lim.acquire()
+            return fn(model_name, prompt, schema, prefix)
+        if not LLM_CACHE:
+            return call()
+        key = hashlib.sha256((model_name + orjson.dumps(schema, option=orjson.OPT_SORT_KEYS).decode() + prefix + prompt).encode()).hexdigest()
+        data = cache_get(key)
+        if data is None:
+            data = call()
+            # answers the caller would reject are not worth keeping
+            if valid is None or valid(data):
+                cache_put(key, data)
+        return data
+    return wrapper
+
+CTX_CACHE_TTL = 3600
+_ctx_caches: dict[tuple[str, str], tuple[str | None, float]] = {}
+_ctx_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=None)
+def genai_client():
+    return genai.Client(api_key=os.environ["GOOGLE_API_KEY"])
+
+def context_cache(client, model_name: str, prefix: str) -> str | None:
+    key = (model_name, prefix)
+    with _ctx_lock:
+        name, expires = _ctx_caches.get(key, (None, 0.0))
+        if _time.time() < expires:
+            return name
+        try:
+            cache = client.caches.create(
+                model=model_name,
+                config={
+                    "contents": [{"role":"user","parts":[{"text":prefix}]}],
+                    "ttl": f"{CTX_CACHE_TTL}s",
+                },
+            )
+            name = cache.name
+        except Exception:
+            name = None
+        _ctx_caches[key] = (name, _time.time() + CTX_CACHE_TTL - 60)
+        return name
+
+@cached_llm
+def gemini_json(model_name: str, prompt: str, schema: dict, prefix: str = "") -> dict:
+    client = genai_client()
+    config = {
+        "temperature": 0,
+        "top_p": 0,
+        "response_mime_type": "application/json",
+        "response_schema": schema,
+    }
+    cache_name = context_cache(client, model_name, prefix) if prefix else None
+    if cache_name:
+        config["cached_content"] = cache_name
+    else:
+        prompt = prefix + prompt
     rsp = client.models.generate_content(
         model=model_name,
         contents=[{"role":"user","parts":[{"text":prompt}]}],
-        config={
-            "temperature": 0,
-            "top_p": 0,
-            "response_mime_type": "application/json",
-            "response_schema": schema,
-        },
+        config=config,
     )
 
     txt = getattr(rsp, "text", None)
@@ -96,9 +186,10 @@ def gemini_json(model_name: str, prompt: str, schema: dict) -> dict:
     if not txt:
         raise RuntimeError("empty JSON from model")
 
-    return json.loads(txt)
+    return orjson.loads(txt)
 
-def schema_of(doc_type: str) -> dict:
+@functools.lru_cache(maxsize=None)
+def _flat_schema(doc_type: str) -> dict:
     raw = DOC_MODEL[doc_type].model_json_schema()
     defs = raw.get("$defs", {})
 
@@ -116,14 +207,24 @@ def schema_of(doc_type: str) -> dict:
             return [resolve(x) for x in node]
         return node
 
-    flat = resolve(raw)
+    return resolve(raw)
 
+@functools.lru_cache(maxsize=None)
+def schema_of(doc_type: str) -> dict:
     return {
         "type": "object",
-        "properties": {"details": flat},
+        "properties": {"details": _flat_schema(doc_type)},
         "required": ["details"]
     }
 
+@functools.lru_cache(maxsize=None)
+def schema_of_batch(doc_type: str) -> dict:
+    return {
+        "type": "object",
+        "properties": {"details_list": {"type": "array", "items": _flat_schema(doc_type)}},
+        "required": ["details_list"]
+    }
+
 class Rights(BaseModel):
     access: Optional[bool] = None
     rectification: Optional[bool] = None
@@ -142,12 +243,26 @@ class Rights(BaseModel):
             elif val_self is None and val_other is False:
                 setattr(self, field, False)
 
+class UniqueListsModel(BaseModel):
+    _seen: Dict[str, set] = PrivateAttr(default_factory=dict)
+
+    def _extend_unique(self, field: str, items: List[str]) -> None:
+        cur = getattr(self, field)
+        seen = self._seen.get(field)
+        if seen is None:
+            cur[:] = dict.fromkeys(cur)
+            seen = self._seen[field] = set(cur)
+        for x in items:
+            if x not in seen:
+                seen.add(x)
+                cur.append(x)
+
 class CookieDuration(BaseModel):
     session: Optional[bool] = None
     persistent: Optional[bool] = None
     max_exp: Optional[str] = None
 
-class PrivacyDetails(BaseModel):
+class PrivacyDetails(UniqueListsModel):
     controller: Optional[str] = None
     dpo_contact: Optional[str] = None
     purposes: List[str] = Field(default_factory=list)
@@ -164,7 +279,7 @@ class PrivacyDetails(BaseModel):
         if o.transfer_scope is None and self.transfer_scope is None:
             pass
         for k in ("purposes", "legal_bases", "recipients"):
-            setattr(self, k, list(dict.fromkeys(getattr(self, k) + getattr(o, k))))
+            self._extend_unique(k, getattr(o, k))
         for k in ("controller", "dpo_contact", "source_of_data", "retention"):
             if getattr(o, k) and not getattr(self, k):
                 setattr(self, k, getattr(o, k))
@@ -177,7 +292,7 @@ class PrivacyDetails(BaseModel):
         if o.automated_decisions is True or self.automated_decisions is None:
             self.automated_decisions = o.automated_decisions
 
-class CookieDetails(BaseModel):
+class CookieDetails(UniqueListsModel):
     ownership: Optional[str] = None
     third_parties: List[str] = Field(default_factory=list)
     types: List[str] = Field(default_factory=list)
@@ -187,7 +302,7 @@ class CookieDetails(BaseModel):
     mgmt_instructions: Optional[bool] = None
     def merge(self, o: "CookieDetails") -> None:
         for k in ("third_parties", "types", "purpose"):
-            setattr(self, k, list(dict.fromkeys(getattr(self, k) + getattr(o, k))))
+            self._extend_unique(k, getattr(o, k))
         if self.ownership is None:
             self.ownership = o.ownership
         elif o.ownership == "MIXED" or (self.ownership == "FIRST" and o.ownership != "FIRST"):
@@ -216,7 +331,7 @@ class LegalNoticeDetails(BaseModel):
         if o.liability_clause is True:
             self.liability_clause = True
 
-class DataProtectionDetails(BaseModel):
+class DataProtectionDetails(UniqueListsModel):
     dpo_contact: Optional[str] = None
     rights: Rights = Rights()
     rights_general_statement: Optional[bool] = None
@@ -228,7 +343,7 @@ class DataProtectionDetails(BaseModel):
     complaint_authority: Optional[bool] = None
     def merge(self, o: "DataProtectionDetails") -> None:
         for k in ("recipients",):
-            setattr(self, k, list(dict.fromkeys(getattr(self, k)+getattr(o, k))))
+            self._extend_unique(k, getattr(o, k))
         for k in ("dpo_contact","source_of_data","retention"):
             if getattr(o,k) and not getattr(self,k):
                 setattr(self,k,getattr(o,k))
@@ -281,66 +396,66 @@ _MORE_PAT = re.compile(
     flags=re.I | re.U
 )
 
+_JUR_PAT = re.compile(
+    r"(?P<UK>\.gov\.uk)|(?P<AU>\.gov\.au)|(?P<MX>\.gob\.mx)|(?P<CL>\.gob\.cl)"
+    r"|(?P<ZA>\.gov\.za)|(?P<IN>\.gov\.in|\.nic\.in)"
+)
+
+@functools.lru_cache(maxsize=None)
+def _jurisdiction_for_host(netloc: str) -> str:
+    m = _JUR_PAT.search(netloc.lower())
+    return m.lastgroup if m else "GEN"
+
 def infer_jurisdiction(url: str) -> str:
-    host = ul.urlparse(url).netloc.lower()
-    if ".gov.uk" in host: return "UK"
-    if ".gov.au" in host: return "AU"
-    if ".gob.mx" in host: return "MX"
-    if ".gob.cl" in host: return "CL"
-    if ".gov.za" in host: return "ZA"
-    if host.endswith(".gov.in") or host.endswith(".nic.in") or ".gov.in" in host or ".nic.in" in host: return "IN"
-    return "GEN"
+    return _jurisdiction_for_host(ul.urlsplit(url).netloc)
+
+_HINTS = {
+    ("MX", "es"): "Marco: LGPDPPSO (sector público). Busca Aviso de Privacidad, derechos ARCO "
+        "(acceso/rectificación/cancelación/oposición) y cómo ejercerlos. Autoridad: "
+        "Secretaría Anticorrupción y Buen Gobierno / ‘Transparencia para el Pueblo’.",
+    ("CL", "es"): "Marco: Ley 19.628 (vigente) y nueva Ley 21.719 (LPPD) en transición hasta dic-2026. "
+        "Fíjate en responsable, finalidades, cesiones, derechos ARCO + portabilidad + bloqueo, "
+        "y canal ante la futura DPA.",
+    ("ZA", "es"): "Marco: POPIA. ‘Information Officer’ como contacto; derechos (acceso/corrección/borrado/"
+        "oposición; no solo decisiones automatizadas); transferencias (s.72); quejas ante "
+        "el Information Regulator.",
+    ("AU", "es"): "Marco: Privacy Act 1988 (APPs). Derechos típicos: acceso (APP12) y corrección (APP13); "
+        "transferencias (APP8). OAIC para quejas; políticas claras de privacidad y NDB scheme.",
+    ("UK", "es"): "Marco: UK GDPR + Data Protection Act 2018; cookies bajo PECR. Derechos: acceso, "
+        "rectificación, supresión, restricción, portabilidad, oposición y no decisiones "
+        "solo automatizadas. ICO como autoridad.",
+    ("IN", "es"): "Marco: DPDP Act 2023 (implementación pendiente). Busca Data Fiduciary/Grievance Officer, "
+        "derechos (acceso/corrección/actualización/borrado) y vía de queja al Data Protection Board.",
+    ("MX", "en"): "Apply LGPDPPSO (public sector). Look for a Privacy Notice, ARCO rights and how to exercise "
+        "them. Authority is now the Secretariat for Anti-Corruption & Good Government / "
+        "‘Transparencia para el Pueblo’ (not INAI).",
+    ("CL", "en"): "Apply Chilean law: Law 19.628 (in force) and new Law 21.719 (LPPD) transitioning until Dec-2026. "
+        "Expect controller, purposes, disclosures, ARCO rights plus portability and blocking; DPA being set up.",
+    ("ZA", "en"): "Apply POPIA. Map ‘Information Officer’ to DPO contact; data subject rights (access/correction/"
+        "erasure/object; no solely automated decisions); cross-border under s.72; complaints to the Information Regulator.",
+    ("AU", "en"): "Apply Privacy Act 1988 (APPs). Expect access (APP12) and correction (APP13); cross-border under APP 8; "
+        "OAIC complaints; NDB scheme applies.",
+    ("UK", "en"): "Apply UK GDPR + Data Protection Act 2018; cookies under PECR. Rights include access, rectification, "
+        "erasure, restriction, portability, objection and limits on automated decisions. ICO is the regulator.",
+    ("IN", "en"): "Apply DPDP Act 2023 (not fully in force yet). Look for Data Fiduciary/Grievance Officer, rights "
+        "(access/correction/update/erasure) and complaints to the Data Protection Board.",
+}
 
+@functools.lru_cache(maxsize=None)
 def jurisdiction_hint(jur: str, lang: str, doc_type: str) -> str:
-    es = (lang or "en").startswith("es")
-    if es:
-        if jur == "MX":
-            return ("Marco: LGPDPPSO (sector público). Busca Aviso de Privacidad, derechos ARCO "
-                    "(acceso/rectificación/cancelación/oposición) y cómo ejercerlos. Autoridad: "
-                    "Secretaría Anticorrupción y Buen Gobierno / ‘Transparencia para el Pueblo’.")
-        if jur == "CL":
-            return ("Marco: Ley 19.628 (vigente) y nueva Ley 21.719 (LPPD) en transición hasta dic-2026. "
-                    "Fíjate en responsable, finalidades, cesiones, derechos ARCO + portabilidad + bloqueo, "
-                    "y canal ante la futura DPA.")
-        if jur == "ZA":
-            return ("Marco: POPIA. ‘Information Officer’ como contacto; derechos (acceso/corrección/borrado/"
-                    "oposición; no solo decisiones automatizadas); transferencias (s.72); quejas ante "
-                    "el Information Regulator.")
-        if jur == "AU":
-            return ("Marco: Privacy Act 1988 (APPs). Derechos típicos: acceso (APP12) y corrección (APP13); "
-                    "transferencias (APP8). OAIC para quejas; políticas claras de privacidad y NDB scheme.")
-        if jur == "UK":
-            return ("Marco: UK GDPR + Data Protection Act 2018; cookies bajo PECR. Derechos: acceso, "
-                    "rectificación, supresión, restricción, portabilidad, oposición y no decisiones "
-                    "solo automatizadas. ICO como autoridad.")
-        if jur == "IN":
-            return ("Marco: DPDP Act 2023 (implementación pendiente). Busca Data Fiduciary/Grievance Officer, "
-                    "derechos (acceso/corrección/actualización/borrado) y vía de queja al Data Protection Board.")
-        return ""
-    else:
-        if jur == "MX":
-            return ("Apply LGPDPPSO (public sector). Look for a Privacy Notice, ARCO rights and how to exercise "
-                    "them. Authority is now the Secretariat for Anti-Corruption & Good Government / "
-                    "‘Transparencia para el Pueblo’ (not INAI).")
-        if jur == "CL":
-            return ("Apply Chilean law: Law 19.628 (in force) and new Law 21.719 (LPPD) transitioning until Dec-2026. "
-                    "Expect controller, purposes, disclosures, ARCO rights plus portability and blocking; DPA being set up.")
-        if jur == "ZA":
-            return ("Apply POPIA. Map ‘Information Officer’ to DPO contact; data subject rights (access/correction/"
-                    "erasure/object; no solely automated decisions); cross-border under s.72; complaints to the Information Regulator.")
-        if jur == "AU":
-            return ("Apply Privacy Act 1988 (APPs). Expect access (APP12) and correction (APP13); cross-border under APP 8; "
-                    "OAIC complaints; NDB scheme applies.")
-        if jur == "UK":
-            return ("Apply UK GDPR + Data Protection Act 2018; cookies under PECR. Rights include access, rectification, "
-                    "erasure, restriction, portability, objection and limits on automated decisions. ICO is the regulator.")
-        if jur == "IN":
-            return ("Apply DPDP Act 2023 (not fully in force yet). Look for Data Fiduciary/Grievance Officer, rights "
-                    "(access/correction/update/erasure) and complaints to the Data Protection Board.")
-        return ""
+    grp = "es" if (lang or "en").startswith("es") else "en"
+    return _HINTS.get((jur, grp), "")
+
+_http_local = threading.local()
+
+def _session() -> requests.Session:
+    sess = getattr(_http_local, "session", None)
+    if sess is None:
+        sess = _http_local.session = requests.Session()
+    return sess
 
 def fetch(url: str, timeout: int = 30, accept_language: str | None = None) -> tuple[str, str]:
-    sess = requests.Session()
+    sess = _session()
     for attempt_url in (url, url.replace("https://", "http://")):
         try:
             r = sess.get(
@@ -375,9 +490,12 @@ def fetch(url: str, timeout: int = 30, accept_language: str | None = None) -> tu
 
             if ctype == "application/pdf":
                 try:
-                    import io
-                    from pdfminer.high_level import extract_text
-                    return extract_text(io.BytesIO(r.content)) or "", ctype
+                    import pypdfium2 as pdfium
+                    pdf = pdfium.PdfDocument(r.content)
+                    try:
+                        return "\n".join(p.get_textpage().get_text_range() for p in pdf), ctype
+                    finally:
+                        pdf.close()
                 except Exception as e:
                     print("Error PDF‑parse", attempt_url, e, file=sys.stderr)
                     return "", ctype
@@ -388,32 +506,34 @@ def fetch(url: str, timeout: int = 30, accept_language: str | None = None) -> tu
 
     return "", ""
 
-def _click_if(page, pattern, timeout=2500):
-    for el in page.locator("button, input[type=button], a, div[role=button]").all():
-        try:
-            txt = el.inner_text(timeout=300).strip()
-        except PWTimeout:
-            continue
-        if pattern.search(txt):
-            try:
-                el.click(timeout=timeout)
-                return True
-            except PWTimeout:
-                pass
-    return False
+_CLICK_JS = """([src, flags]) => {
+    const rx = new RegExp(src, flags);
+    for (const e of document.querySelectorAll("button, input[type=button], a, div[role=button]")) {
+        const r = e.getBoundingClientRect();
+        if (!r.width || !r.height || e.disabled) continue;
+        if (rx.test((e.innerText || "").trim())) { e.click(); return true; }
+    }
+    return false;
+}"""
+
+async def _click_if(page, pattern):
+    try:
+        return bool(await page.evaluate(_CLICK_JS, [pattern.pattern, "iu"]))
+    except Exception:
+        return False
 
-def _safe_scroll_to_bottom(page):
+async def _safe_scroll_to_bottom(page):
     try:
-        page.evaluate("""() => {
+        await page.evaluate("""() => {
             const b = document && document.body;
             if (b) window.scrollTo(0, b.scrollHeight);
         }""")
     except Exception:
         pass
 
-def _safe_scroll_height(page) -> int:
+async def _safe_scroll_height(page) -> int:
     try:
-        return page.evaluate("""() => (document && document.body) ? document.body.scrollHeight : 0""")
+        return await page.evaluate("""() => (document && document.body) ? document.body.scrollHeight : 0""")
     except Exception:
         return 0
 
@@ -423,81 +543,153 @@ def needs_render(html: str, plain: str) -> bool:
     return words < 300 and ratio < 0.05
 
 
-def fetch_render(url: str, timeout: int = 30, accept_language: str | None = None) -> tuple[str, str]:
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True, args=["--no-sandbox"])
-        page = browser.new_page(extra_http_headers={"Accept-Language": accept_language or "en-GB,en;q=0.9,es;q=0.6"})
-        page.goto(url, wait_until="load", timeout=timeout * 1000)
+_render_loop: asyncio.AbstractEventLoop | None = None
+_render_loop_lock = threading.Lock()
+_pw = None
+_browser = None
+_browser_lock: asyncio.Lock | None = None
+_render_sem: asyncio.Semaphore | None = None
+
+def _render_loop_get() -> asyncio.AbstractEventLoop:
+    global _render_loop
+    with _render_loop_lock:
+        if _render_loop is None:
+            _render_loop = asyncio.new_event_loop()
+            threading.Thread(target=_render_loop.run_forever, daemon=True).start()
+            atexit.register(_close_renderer)
+    return _render_loop
+
+async def _get_browser():
+    global _pw, _browser, _browser_lock, _render_sem
+    if _browser_lock is None:
+        _browser_lock = asyncio.Lock()
+        _render_sem = asyncio.Semaphore(RENDER_CONCURRENCY)
+    async with _browser_lock:
+        if _browser is None or not _browser.is_connected():
+            if _pw is None:
+                _pw = await async_playwright().start()
+            _browser = await _pw.chromium.launch(headless=True, args=["--no-sandbox"])
+    return _browser
+
+async def _shutdown_renderer():
+    if _browser is not None:
+        await _browser.close()
+    if _pw is not None:
+        await _pw.stop()
+
+def _close_renderer():
+    try:
+        asyncio.run_coroutine_threadsafe(_shutdown_renderer(), _render_loop).result(timeout=10)
+    except Exception:
+        pass
+
+_HEAVY_RESOURCES = {"image", "media", "font"}
+_READY_SELECTOR = "main, [role=main], article, .policy, #contenido"
+
+async def _block_heavy(route):
+    if route.request.resource_type in _HEAVY_RESOURCES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+async def fetch_render_async(url: str, timeout: int = 30, accept_language: str | None = None) -> tuple[str, str]:
+    browser = await _get_browser()
+    async with _render_sem:
+        ctx = await browser.new_context(extra_http_headers={"Accept-Language": accept_language or "en-GB,en;q=0.9,es;q=0.6"})
         try:
-            page.wait_for_load_state("networkidle", timeout=60000)
-        except PWTimeout:
-            pass
-        _safe_scroll_to_bottom(page)
-        page.wait_for_timeout(1200)
-        _click_if(page, _ACCEPT_PAT) or _click_if(page, _REJECT_PAT)
-        page.eval_on_selector_all(
-            "details:not([open])",
-            "(els) => els.forEach(e => e.open = true)"
-        )
-        for btn in page.locator("[aria-expanded='false']").all():
+            await ctx.route("**/*", _block_heavy)
+            page = await ctx.new_page()
+            await page.goto(url, wait_until="domcontentloaded", timeout=timeout * 1000)
             try:
-                btn.click(force=True, timeout=800)
-            except Exception:
+                await page.wait_for_selector(_READY_SELECTOR, timeout=8000)
+            except PWTimeout:
                 pass
-        if _click_if(page, _MORE_PAT):
-            page.wait_for_timeout(1500)
-        page.wait_for_timeout(500)
-
-        prev_height = 0
-        for _ in range(12):
-            _safe_scroll_to_bottom(page)
-            page.wait_for_timeout(1000)
-            curr_height = _safe_scroll_height(page)
-            if curr_height == prev_height:
-                break
-            prev_height = curr_height
-
-        html = page.content()
-        mime = "text/html"
-        if looks_like_acceda_stub(html):
-            page.wait_for_timeout(1000)
-            html = page.content()
-
-        browser.close()
-        return html, mime
+            await _safe_scroll_to_bottom(page)
+            await page.wait_for_timeout(1200)
+            await _click_if(page, _ACCEPT_PAT) or await _click_if(page, _REJECT_PAT)
+            await page.eval_on_selector_all(
+                "details:not([open])",
+                "(els) => els.forEach(e => e.open = true)"
+            )
+            for btn in await page.locator("[aria-expanded='false']").all():
+                try:
+                    await btn.click(force=True, timeout=800)
+                except Exception:
+                    pass
+            if await _click_if(page, _MORE_PAT):
+                await page.wait_for_timeout(1500)
+            await page.wait_for_timeout(500)
+
+            prev_height = 0
+            for _ in range(12):
+                await _safe_scroll_to_bottom(page)
+                await page.wait_for_timeout(1000)
+                curr_height = await _safe_scroll_height(page)
+                if curr_height == prev_height:
+                    break
+                prev_height = curr_height
+
+            html = await page.content()
+            mime = "text/html"
+            if await asyncio.to_thread(looks_like_acceda_stub, html):
+                await page.wait_for_timeout(1000)
+                html = await page.content()
+
+            return html, mime
+        finally:
+            await ctx.close()
+
+def fetch_render(url: str, timeout: int = 30, accept_language: str | None = None) -> tuple[str, str]:
+    fut = asyncio.run_coroutine_threadsafe(fetch_render_async(url, timeout, accept_language), _render_loop_get())
+    return fut.result()
+
+_HTML_PARSER = lxml.html.HTMLParser(encoding="utf-8")
+_DROP_TAGS = ("script", "style", "noscript", "header", "footer", "nav", "aside", "form")
+
+def _parse_html(html: str):
+    if not html.strip():
+        return None
+    try:
+        return lxml.html.document_fromstring(html.encode("utf-8", "ignore"), parser=_HTML_PARSER)
+    except etree.ParserError:
+        return None
+
+_NO_TEXT = {"script", "style", "template"}
+
+def _text_of(root, hidden=frozenset()) -> str:
+    parts, stack = [], [(root, False)]
+    while stack:
+        el, done = stack.pop()
+        if done:
+            if el.tail: parts.append(el.tail)
+            continue
+        if el is not root:
+            stack.append((el, True))
+        if not isinstance(el.tag, str) or el.tag in _NO_TEXT or el in hidden:
+            continue
+        if el.text: parts.append(el.text)
+        stack.extend((c, False) for c in reversed(el))
+    return " ".join(t.strip() for t in parts if t.strip())
 
 def extract_text(html:str)->str:
-    soup = BeautifulSoup(html, "lxml")
-    main = (
-        soup.find("main")
-        or soup.find(attrs={"role": "main"})
-        or soup
-    )
-    for tag in main(
-        [
-            "script",
-            "style",
-            "noscript",
-            "header",
-            "footer",
-            "nav",
-            "aside",
-            "form",
-        ]
-    ):
-
-        tag.decompose()
-    for el in main.select('[aria-hidden="true"], [style*="display:none"]'):
-        el.decompose()
+    doc = _parse_html(html)
+    if doc is None:
+        return ""
+    main = next(doc.iter("main"), None)
+    if main is None:
+        main = next(iter(doc.xpath('//*[@role="main"]')), doc)
+    hidden = {el for el in main.iter(*_DROP_TAGS) if el is not main}
+    hidden.update(main.xpath('.//*[@aria-hidden="true" or contains(@style, "display:none")]'))
     lines = (
         line.strip()
-        for line in main.get_text(" ", strip=True).splitlines()
+        for line in _text_of(main, hidden).splitlines()
         if line.strip()
     )
     clean = "\n".join(dict.fromkeys(lines))
 
     return clean
 
+@functools.lru_cache(maxsize=None)
 def _accept_language_for(lang: str | None) -> str:
     grp = (lang or "en").split("-")[0].lower()
     if grp == "es": return "es-ES,es;q=0.9,en;q=0.6"
@@ -505,27 +697,22 @@ def _accept_language_for(lang: str | None) -> str:
     if grp == "ml": return "ml-IN,ml;q=0.9,en;q=0.6"
     return "en-GB,en;q=0.9,es;q=0.6"
 
-def looks_like_acceda_stub(html: str) -> bool:
-    soup = BeautifulSoup(html, "lxml")
+_STUB_JS = re.compile(r"<noscript[^>]*>(?:(?!</noscript).)*?JavaScript desactivado", re.I | re.S)
+_STUB_LOC = re.compile(r"<script[^>]*>(?:(?!</script).)*?window\.location", re.I | re.S)
+_STUB_REFRESH = re.compile(r"<meta[^>]+http-equiv\s*=\s*[\"']?[^\"'>]*refresh", re.I)
+_NON_TEXT = re.compile(r"<!--.*?-->|<(script|style|template)\b.*?</\1\s*>", re.I | re.S)
+_TAG = re.compile(r"<[^>]*>")
 
-    if len(soup.get_text(" ", strip=True).split()) > 200:
+def looks_like_acceda_stub(html: str) -> bool:
+    if not (_STUB_JS.search(html) or _STUB_LOC.search(html) or _STUB_REFRESH.search(html)):
         return False
-
-    if soup.find("noscript", string=re.compile("JavaScript desactivado", re.I)):
-        return True
-    if soup.find("script",  string=re.compile(r"window\.location", re.I)):
-        return True
-    if soup.find("meta",    attrs={"http-equiv": re.compile("refresh", re.I)}):
-        return True
-
-    return False
+    text = _TAG.sub(" ", _NON_TEXT.sub(" ", html))
+    return len(text.split(None, 200)) <= 200
 
 
 def split_chunks(text:str)->List[str]:
-    words=text.split(); res=[]; i=0
-    while i<len(words):
-        res.append(" ".join(words[i:i+CHUNK_TOKENS])); i+=CHUNK_TOKENS-CHUNK_OVERLAP
-    return res
+    words=text.split(); step=max(1, CHUNK_TOKENS-CHUNK_OVERLAP)
+    return [" ".join(words[i:i+CHUNK_TOKENS]) for i in range(0, len(words), step)]
 
 FIELD_DEFS_ES = {
     "PRIVACY_POLICY": """\
@@ -629,7 +816,34 @@ Fields → details
 }"""
 }
 
-def build_prompt(doc_type: str, chunk: str, lang: str, jur_hint: str = "") -> str:
+_PRIVACY_TERMS = (
+    "privacidad", "privacy", "datos personales", "personal data", "personal information", "responsable",
+    "controller", "finalidad", "purpose", "legitimaci", "legal basis", "lawful", "base jurídica", "conserva",
+    "retention", "retain", "destinatario", "recipient", "cesi", "transfer", "derecho", "rights", "delegado",
+    r"dpo\b", r"dpd\b", "protección de datos", "data protection", "tratamiento", "processing", "automatizad", "automated",
+)
+_KEYWORDS = {
+    "PRIVACY_POLICY": _PRIVACY_TERMS,
+    "DATA_PROTECTION": _PRIVACY_TERMS + ("reclamaci", "complaint", "autoridad de control", "supervisory", r"aepd\b", r"ico\b"),
+    "COOKIE_POLICY": (
+        "cookie", "galleta", "rastreo", "tracking", "analític", "analytic", "consent", "navegador", "browser",
+        "tercero", "third part", "sesión", "session", "persistent", "caducidad", "expir", "duración", "duration",
+    ),
+    "LEGAL_NOTICE": (
+        "aviso legal", "legal notice", "titular", "owner", "propiedad intelectual", "intellectual property",
+        "copyright", "derechos de autor", "responsabilidad", "liability", "legislación", "law", "jurisdic",
+        "tribunal", "court", "contact", r"nif\b", r"cif\b", "términos", "terms", "condiciones", "conditions",
+    ),
+}
+CHUNK_KEYWORDS = {dt: re.compile(r"\b(?:" + "|".join(kws) + ")", re.I) for dt, kws in _KEYWORDS.items()}
+
+def relevant_chunks(chunks: List[str], doc_type: str, lang: str | None) -> List[str]:
+    if not (lang or "en").startswith(("es", "en")) or doc_type not in CHUNK_KEYWORDS:
+        return chunks
+    kw = CHUNK_KEYWORDS[doc_type]
+    return [c for c in chunks if kw.search(c)] or chunks[:1]
+
+def prompt_prefix(doc_type: str, lang: str, jur_hint: str = "") -> str:
     if lang == "es":
         base = "Eres un auditor experto en RGPD."
         instr  = "Analiza el documento y responde EXCLUSIVAMENTE con el objeto JSON bajo la clave `details`, sin comentarios ni código markdown. **IMPORTANTE → Usa EXACTAMENTE las claves y los tipos indicados abajo. No uses null para listas u objetos; si el documento guarda silencio usa [] o {}.**"
@@ -648,7 +862,10 @@ def build_prompt(doc_type: str, chunk: str, lang: str, jur_hint: str = "") -> st
 
     header = f"{base}\n{jur_hint}".strip()
 
-    return f"{header}\n{instr}\n\n{schema}\n\n{label}\n{chunk[:10000]}"
+    return f"{header}\n{instr}\n\n{schema}\n\n{label}\n"
+
+def build_prompt(doc_type: str, chunk: str, lang: str, jur_hint: str = "") -> str:
+    return prompt_prefix(doc_type, lang, jur_hint) + chunk[:10000]
 
 class RateLimiter:
     def __init__(self, per_min: int, per_sec: int = 1):
@@ -687,9 +904,20 @@ class DailyQuotaExceeded(RuntimeError): pass
 stop_event = threading.Event()
 
 def call_llm(prompt:str,provider:str,model:str,lim:RateLimiter,dbg=False)->str:
+    if not LLM_CACHE:
+        return _call_llm(prompt, provider, model, lim, dbg)
+    key = hashlib.sha256(f"{provider}|{model}|{prompt}".encode()).hexdigest()
+    txt = cache_get(key)
+    if txt is None:
+        txt = _call_llm(prompt, provider, model, lim, dbg)
+        if txt:
+            cache_put(key, txt)
+    return txt
+
+def _call_llm(prompt:str,provider:str,model:str,lim:RateLimiter,dbg=False)->str:
     lim.acquire()
     if provider=="gemini":
-        client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        client = genai_client()
         current = model
         for i in range(MAX_RETRIES_LLM):
             if stop_event.is_set():
@@ -723,8 +951,17 @@ def call_llm(prompt:str,provider:str,model:str,lim:RateLimiter,dbg=False)->str:
 class Link(BaseModel):
     domain:str; url:str; doc_type:str; anchor_text:str|None; lang:str|None
 
+_LINKS = TypeAdapter(list[Link])
+
+def _is_silence(s: str) -> bool:
+    # set lookup covers the usual spellings; the regex only sees odd spacing
+    t = s.strip().lower()
+    if t in _SILENCE_WORDS:
+        return True
+    return bool(t) and t[0] in "nu" and _SILENCE_PAT.match(s) is not None
+
 def _empty_if_silence(v):
-    if isinstance(v, str) and _SILENCE_PAT.match(v):
+    if isinstance(v, str) and _is_silence(v):
         return ""
     return v
 
@@ -733,7 +970,7 @@ def _list_or_empty(v):
         return []
     if isinstance(v, str):
         s = v.strip()
-        return [] if not s or _SILENCE_PAT.match(s) else [s]
+        return [] if not s or _is_silence(s) else [s]
     if isinstance(v, dict):
         return list(v.values())
     if isinstance(v, list):
@@ -811,6 +1048,37 @@ def sanitize_raw(raw: dict, doc_type: str) -> dict:
 
     return raw
 
+def chunk_details(body: str, doc_type: str, prefix: str, prov, model, lim, dbg=False) -> dict:
+    try:
+        schema = schema_of(doc_type)
+        data = gemini_json(model, body, schema, prefix, lim)
+        return data.get("details", data)
+    except Exception as e:
+        if dbg: print("schema JSON failed; fallback --> text balance:", e)
+        raw_txt = call_llm(prefix + body, prov, model, lim, dbg)
+        try:
+            parsed = orjson.loads(find_balanced_json(raw_txt))
+        except Exception:
+            parsed = {}
+        return parsed.get("details", parsed)
+
+def batch_details(chunks: List[str], doc_type: str, prefix: str, model, lim, dbg=False) -> list | None:
+    body = "Return one `details` object per CHUNK, in the same order, inside `details_list`.\n" + "".join(
+        f"\n---CHUNK {i}---\n{c[:10000]}" for i, c in enumerate(chunks, 1)
+    )
+    def complete(data) -> bool:
+        # one object per chunk, or the missing chunks' details would be dropped silently
+        items = data.get("details_list") if isinstance(data, dict) else None
+        return isinstance(items, list) and len(items) == len(chunks)
+    try:
+        data = gemini_json(model, body, schema_of_batch(doc_type), prefix, lim, valid=complete)
+        if complete(data):
+            return data["details_list"]
+        if dbg: print("batch JSON incomplete; fallback --> per chunk")
+    except Exception as e:
+        if dbg: print("batch JSON failed; fallback --> per chunk:", e)
+    return None
+
 def audit_one(link:Link,prov,model,lim,dbg=False)->dict|None:
     if stop_event.is_set(): return None
 
@@ -848,36 +1116,41 @@ def audit_one(link:Link,prov,model,lim,dbg=False)->dict|None:
             if dbg: print("Error RENDER fallback failed:", e)
             return None
     if not text:
-        text = BeautifulSoup(html, "lxml").get_text(" ", strip=True)
+        doc = _parse_html(html)
+        text = _text_of(doc) if doc is not None else ""
     if not text.strip():
         if dbg: print("Error EMPTY‑TEXT", link.url[:100])
         return None
     combined: BaseModel | None = None
     last_raw={}
-    for chunk_no, chunk in enumerate(split_chunks(text), 1):
-        if stop_event.is_set(): break
+    jur = infer_jurisdiction(link.url)
+    hint = jurisdiction_hint(jur, link.lang or "en", link.doc_type)
+    prefix = prompt_prefix(link.doc_type, link.lang, hint)
+    chunks = relevant_chunks(split_chunks(text), link.doc_type, link.lang)
+
+    def one_chunk(numbered):
+        chunk_no, chunk = numbered
         if dbg:
             print(f"  chunk {chunk_no}, {len(chunk.split())}words")
-
-        jur = infer_jurisdiction(link.url)
-        hint = jurisdiction_hint(jur, link.lang or "en", link.doc_type)
-
-        prompt = build_prompt(link.doc_type, chunk, link.lang, hint)
-
-        try:
-            schema = schema_of(link.doc_type)
-            data = gemini_json(model, prompt, schema)
-            raw_response = data.get("details", data)
-
-        except Exception as e:
-            if dbg: print("schema JSON failed; fallback --> text balance:", e)
-            raw_txt = call_llm(prompt, prov, model, lim, dbg)
-            try:
-                parsed = json.loads(find_balanced_json(raw_txt))
-            except Exception:
-                parsed = {}
-            raw_response = parsed.get("details", parsed)
-
+        return chunk_details(chunk[:10000], link.doc_type, prefix, prov, model, lim, dbg)
+
+    def batched():
+        # evenly sized sub-batches under BATCH_MAX_WORDS, sent concurrently;
+        # chunks of a failed batch are retried one call each, also concurrently
+        n_batches = max(1, -(-len(chunks) * CHUNK_TOKENS // BATCH_MAX_WORDS))
+        size = -(-len(chunks) // n_batches)
+        groups = [chunks[i:i + size] for i in range(0, len(chunks), size)]
+        with ThreadPoolExecutor(max_workers=CHUNK_CONCURRENCY) as pool:
+            results = list(pool.map(
+                lambda g: batch_details(g, link.doc_type, prefix, model, lim, dbg) if len(g) > 1 else None, groups))
+            failed = [(i * size + j, c) for i, (g, r) in enumerate(zip(groups, results)) if r is None
+                      for j, c in enumerate(g, 1)]
+            singles = pool.map(one_chunk, failed)
+            for g, r in zip(groups, results):
+                yield from r if r is not None else itertools.islice(singles, len(g))
+
+    for raw_response in batched():
+        if stop_event.is_set(): break
         last_raw = sanitize_raw(raw_response, link.doc_type)
 
         if not last_raw:
@@ -904,16 +1177,17 @@ def audit_one(link:Link,prov,model,lim,dbg=False)->dict|None:
         "lang": link.lang,
         "last_update": last_raw.get("last_update","NO_DATE"),
         "details": combined.model_dump(),
-        "sha1": hashlib.sha1(link.url.encode()).hexdigest(),
+        "sha1": link_hash(link),
     }
 
 def safe_json_line(text: str) -> dict:
     try:
-        return json.loads(text)
-    except json.JSONDecodeError:
-        return json.loads(find_balanced_json(text))
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return orjson.loads(find_balanced_json(text))
 
 def main():
+    global LLM_CACHE
     ap=argparse.ArgumentParser(description="Audit policy docs with Gemini/OpenAI (NDJSON out)")
     ap.add_argument("--links",required=True)
     ap.add_argument("--output",required=True)
@@ -922,15 +1196,14 @@ def main():
     ap.add_argument("--rate",type=int,default=8)
     ap.add_argument("--parallel",type=int,default=1)
     ap.add_argument("--debug",action="store_true")
+    ap.add_argument("--cache",help="SQLite file for cached LLM responses (default: llm_cache.sqlite next to --output, '' disables)")
     ns=ap.parse_args()
+    LLM_CACHE = str(Path(ns.output).parent / "llm_cache.sqlite") if ns.cache is None else ns.cache
 
-    links: List[Link] = []
+    # one pydantic-core pass over the whole file instead of a Link(**row) per line
     with open(ns.links, encoding="utf-8") as f:
-        for raw in f:
-            raw = raw.strip()
-            if not raw:
-                continue
-            links.append(Link(**safe_json_line(raw)))
+        rows = [safe_json_line(raw) for raw in map(str.strip, f) if raw]
+    links: List[Link] = _LINKS.validate_python(rows)
 
     out_p=Path(ns.output); out_p.parent.mkdir(parents=True,exist_ok=True)
 
@@ -948,21 +1221,26 @@ def main():
     limiter = RateLimiter(min(ns.rate, FREE_RPM[ns.model]))
 
     done=0
-    with out_p.open("a", encoding="utf-8") as fout, ThreadPoolExecutor(max_workers=ns.parallel) as pool:
+    with out_p.open("ab") as fout, ThreadPoolExecutor(max_workers=ns.parallel) as pool:
         futs = {pool.submit(audit_one, l, ns.provider, ns.model, limiter, ns.debug): l for l in todo}
-        for fut in as_completed(futs):
-            try:
-                res = fut.result()
-                if res:
-                    fout.write(json.dumps(res, ensure_ascii=False) + "\n")
-                    fout.flush()
-                    os.fsync(fout.fileno())
-                    done += 1
-            except DailyQuotaExceeded:
-                for f in futs:
-                    f.cancel()
-                pool.shutdown(wait=False, cancel_futures=True)
-                return
+        try:
+            for fut in as_completed(futs):
+                try:
+                    res = fut.result()
+                    if res:
+                        fout.write(orjson.dumps(res) + b"\n")
+                        fout.flush()
+                        done += 1
+                        if done % FSYNC_EVERY == 0:
+                            os.fsync(fout.fileno())
+                except DailyQuotaExceeded:
+                    for f in futs:
+                        f.cancel()
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    return
+        finally:
+            fout.flush()
+            os.fsync(fout.fileno())
     print(f"OK audit: {done}/{len(links)} documentos → {out_p}")
 
 if __name__ == "__main__":
@@ -1,17 +1,50 @@
 from __future__ import annotations
-import argparse, pathlib, warnings
+import argparse, json, pathlib, warnings
 import pandas as pd, numpy as np
+import pyarrow as pa, pyarrow.parquet as pq
 warnings.filterwarnings("ignore", category=pd.errors.PerformanceWarning)
 import urllib.parse as up
 
+CK_DTYPES = {"same_site": "category", "cookie_domain": "string", "first_party": "string"}
+RQ_DTYPES = {"resource_type": "category", "req_domain": "string", "first_party": "string"}
+SIDECAR_KEY = b"csv_source"
+
+def read_csv_cached(csv: str, dtype: dict) -> pd.DataFrame:
+    # parquet sidecar next to the CSV, tagged with the CSV's size/mtime and the dtype map
+    # it was parsed with; any mismatch (edited CSV, cp -p/rsync -t/checkout, new dtypes) rebuilds it
+    src = pathlib.Path(csv)
+    side = src.with_name(src.name + ".parquet")
+    st = src.stat()
+    key = json.dumps({"size": st.st_size, "mtime_ns": st.st_mtime_ns, "dtype": dtype}, sort_keys=True).encode()
+    try:
+        if side.exists() and (pq.read_schema(side).metadata or {}).get(SIDECAR_KEY) == key:
+            return pd.read_parquet(side)
+    except (OSError, pa.ArrowException):
+        pass
+    df = pd.read_csv(src, engine="pyarrow", dtype=dtype)
+    try:
+        table = pa.Table.from_pandas(df)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), SIDECAR_KEY: key})
+        pq.write_table(table, side, compression="zstd")
+    except (OSError, pa.ArrowException) as e:
+        print(f"[WARN] parquet cache not written ({side}): {e}")
+    return df
+
 def pct(a: pd.Series, b: pd.Series) -> pd.Series:
     return (a / b.replace(0, np.nan)).round(3).fillna(0)
 
 def read_domains(txt: str) -> set[str]:
     return {l.strip().lower() for l in pathlib.Path(txt).read_text().splitlines() if l.strip()}
 
-def top_list(series: pd.Series, n: int = 5) -> str:
-    return ";".join(series.value_counts().head(n).index)
+def third_party_domains(df: pd.DataFrame, flag: str, col: str, index: pd.Index, n: int = 5):
+    # one pass over the 3p rows: per-(site, domain) counts feed both outputs,
+    # most frequent first, ties broken alphabetically
+    counts = (df.loc[df[flag] == 1].groupby(["fp_fqdn", col]).size().rename("n").reset_index()
+                 .sort_values(["fp_fqdn", "n"], ascending=[True, False], kind="stable"))
+    distinct = counts.groupby("fp_fqdn").size().reindex(index, fill_value=0)
+    top = (counts.groupby("fp_fqdn").head(n).groupby("fp_fqdn")[col].agg(";".join)
+                 .reindex(index, fill_value=""))
+    return distinct, top
 
 def norm_host(s: str) -> str:
     s = str(s or "").strip().lower()
@@ -27,6 +60,18 @@ def norm_host(s: str) -> str:
         s = s[4:]
     return s
 
+def fqdn_col(urls: pd.Series) -> pd.Series:
+    host = urls.str.lower().str.split("://", n=1).str[1].str.split("/", n=1).str[0]
+    return host.fillna("").str.strip().str.removeprefix("www.")
+
+def norm_host_col(s: pd.Series) -> pd.Series:
+    # vectorised norm_host: scheme-less values keep any port, URLs lose it like urlsplit().hostname
+    s = s.fillna("").astype("string").str.strip().str.lower()
+    has_scheme = s.str.contains("://", regex=False)
+    host = s.str.split("://", n=1).str[-1].str.split("/", n=1).str[0]
+    host = host.mask(has_scheme, host.str.replace(r":\d*$", "", regex=True))
+    return host.str.removeprefix("www.").astype(object)
+
 def main() -> None:
     ap = argparse.ArgumentParser()
     ap.add_argument("--cookies",   required=True)
@@ -40,34 +85,45 @@ def main() -> None:
 
     official = {norm_host(l) for l in pathlib.Path(args.official).read_text().splitlines() if l.strip()}
 
-    ck = pd.read_csv(args.cookies)
+    ck = read_csv_cached(args.cookies, CK_DTYPES)
 
     ck["first_party"] = ck["first_party"].fillna("")
-    ck["fp_fqdn"] = ck["first_party"].str.extract(r"://([^/]+)")[0].str.lower().fillna("")
-    ck["fp_fqdn"] = ck["fp_fqdn"].apply(norm_host)
+    ck["fp_fqdn"] = fqdn_col(ck["first_party"])
 
-    ck["expiry"] = pd.to_datetime(ck["expiry"], errors="coerce", utc=True)
+    expiry = pd.to_datetime(ck["expiry"], errors="coerce", utc=True, format="ISO8601")
     ck["is_third_party"] = ck["is_third_party"].fillna(0)
 
-    now = pd.Timestamp.utcnow()
-    ck["expiry_days"] = (ck["expiry"] - now).dt.days
+    # whole days in int64 space, in the column's own unit: forcing ns overflows on
+    # far-future expiries (9999-12-31); floor division matches Timedelta.days
+    unit = expiry.dt.unit
+    now = pd.Timestamp.now(tz="UTC").as_unit(unit)
+    days = (expiry.array.asi8 - now.value) // pd.Timedelta(days=1).as_unit(unit).value
+    ck["expiry_days"] = np.where(expiry.isna().to_numpy(), np.nan, days)
     ck["expiry_days_clip"] = ck["expiry_days"].clip(lower=0)
 
+    ss = ck["same_site"].str.lower()
+    ck["_owner"] = ck["owner"].notna()
+    ck["_ss_none"] = ss.eq("none")
+    ck["_ss_lax"] = ss.eq("lax")
+    ck["_ss_strict"] = ss.eq("strict")
+
     g = ck.groupby("fp_fqdn", group_keys=False)
+    total = g.size()
+    ck_3p_domains, ck_3p_top = third_party_domains(ck, "is_third_party", "cookie_domain", total.index)
     cookies = pd.DataFrame({
-        "cookies_total"   : g.size(),
+        "cookies_total"   : total,
         "cookies_3p"      : g["is_third_party"].sum(),
-        "cookie_3p_domains": g.apply(lambda x: x.loc[x["is_third_party"]==1,"cookie_domain"].nunique()),
-        "cookie_3p_top"    : g.apply(lambda x: top_list(x.loc[x["is_third_party"]==1,"cookie_domain"])),
-        "tracker_cookies"  : g.apply(lambda x: x["owner"].notna().sum()),
+        "cookie_3p_domains": ck_3p_domains,
+        "cookie_3p_top"    : ck_3p_top,
+        "tracker_cookies"  : g["_owner"].sum(),
 
         "cookies_secure"  : g["is_secure"].sum(),
         "cookies_httponly": g["is_http_only"].sum(),
         "cookies_session" : g["is_session"].sum(),
 
-        "ss_none"   : g.apply(lambda x: (x["same_site"].str.lower()=="none").sum()),
-        "ss_lax"    : g.apply(lambda x: (x["same_site"].str.lower()=="lax").sum()),
-        "ss_strict" : g.apply(lambda x: (x["same_site"].str.lower()=="strict").sum()),
+        "ss_none"   : g["_ss_none"].sum(),
+        "ss_lax"    : g["_ss_lax"].sum(),
+        "ss_strict" : g["_ss_strict"].sum(),
 
         "expiry_median_days": g["expiry_days_clip"].median().round(1).fillna(0),
         "expiry_max_days"   : g["expiry_days_clip"].max().fillna(0).astype(int),
@@ -83,30 +139,27 @@ def main() -> None:
     cookies["ss_lax_ratio"]           = pct(cookies["ss_lax"], cookies["cookies_total"])
     cookies["ss_strict_ratio"]        = pct(cookies["ss_strict"], cookies["cookies_total"])
 
-    rq = pd.read_csv(args.requests)
+    rq = read_csv_cached(args.requests, RQ_DTYPES)
 
     rq["first_party"] = rq["first_party"].fillna("")
-    rq["fp_fqdn"] = rq["first_party"].str.extract(r"://([^/]+)")[0].str.lower().fillna("")
-    rq["fp_fqdn"] = rq["fp_fqdn"].apply(norm_host)
+    rq["fp_fqdn"] = fqdn_col(rq["first_party"])
 
     rq["is_third_party_dom"] = rq["is_third_party_dom"].fillna(0)
+    rq["_owner"] = rq["owner"].notna()
     g = rq.groupby("fp_fqdn", group_keys=False)
 
-    pivot = rq.pivot_table(index="fp_fqdn",
-                           columns="resource_type",
-                           values="url",
-                           aggfunc="count",
-                           fill_value=0)
+    pivot = (rq.groupby(["fp_fqdn", "resource_type"], observed=True)["url"].count()
+               .unstack(fill_value=0))
     pivot.columns = [f"resources_{c.lower()}" for c in pivot.columns]
 
+    total = g.size()
+    rq_3p_domains, rq_3p_top = third_party_domains(rq, "is_third_party_dom", "req_domain", total.index)
     requests = pd.DataFrame({
-        "req_total"        : g.size(),
+        "req_total"        : total,
         "req_3p"           : g["is_third_party_dom"].sum(),
-        "distinct_3p_req_domains": g.apply(
-            lambda x: x.loc[x["is_third_party_dom"]==1,"req_domain"].nunique()),
-        "req_3p_top"       : g.apply(lambda x: top_list(
-            x.loc[x["is_third_party_dom"]==1,"req_domain"])),
-        "tracker_hits"     : g.apply(lambda x: x["owner"].notna().sum()),
+        "distinct_3p_req_domains": rq_3p_domains,
+        "req_3p_top"       : rq_3p_top,
+        "tracker_hits"     : g["_owner"].sum(),
     }).reset_index().rename(columns={"fp_fqdn":"domain"})
 
     requests["req_3p_ratio"]      = pct(requests["req_3p"], requests["req_total"])
@@ -115,26 +168,22 @@ def main() -> None:
     requests = requests.merge(pivot.reset_index().rename(columns={"fp_fqdn":"domain"}), how="left")
 
     sec_headers = pd.read_csv(args.headers)
-    sec_headers["domain"] = sec_headers["domain"].apply(norm_host)
+    sec_headers["domain"] = norm_host_col(sec_headers["domain"])
 
     tls = pd.read_csv(args.tls_flat)
-    tls["domain"] = tls["domain"].apply(norm_host)
+    tls["domain"] = norm_host_col(tls["domain"])
     tls = (tls.sort_values(["tls_cipher_suites_total","tls_hsts"], ascending=[False, False])
           .drop_duplicates("domain", keep="first"))
     tls["tls_cipher_fs_ratio"] = pct(tls["tls_cipher_suites_fs"], tls["tls_cipher_suites_total"])
     tls["tls_cipher_weak_ratio"] = pct(tls["tls_cipher_suites_weak"], tls["tls_cipher_suites_total"])
 
     fp = pd.read_csv(args.fp_flat).drop(columns=["status","http_status","load_time"], errors="ignore")
-    fp["domain"] = fp["domain"].apply(norm_host)
-
-    all_domains = pd.Series(sorted(official), name="domain").to_frame()
-    df = (all_domains.set_index("domain")
-                    .join(cookies.set_index("domain"))
-                    .join(requests.set_index("domain"))
-                    .join(sec_headers.set_index("domain"))
-                    .join(tls.set_index("domain"))
-                    .join(fp.set_index("domain"))
-                    .reset_index())
+    fp["domain"] = norm_host_col(fp["domain"])
+
+    all_domains = pd.Index(sorted(official), name="domain")
+    parts = [part.drop_duplicates("domain").set_index("domain").reindex(all_domains)
+             for part in (cookies, requests, sec_headers, tls, fp)]
+    df = pd.concat(parts, axis=1).reset_index()
 
     num_cols = df.select_dtypes(include=["number", "boolean"]).columns
     str_cols = df.select_dtypes(include=["object"]).columns
@@ -1,9 +1,20 @@
-import argparse, socket, sys
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, asyncio, socket, sys, time
 from urllib.parse import urlsplit
-import requests
+import aiohttp
+from publicsuffix2 import PublicSuffixList
 
 GOOD = set(range(200,400)) | {401,403}
+RETRY_STATUS = (429, 500, 502, 503, 504)
+HEADERS = {
+    "User-Agent": "TFM-check/1.0 (+research; contact: you@example.com)",
+    "Accept": "*/*",
+}
+DNS_TTL = 300
+ATTEMPTS = (("https", "HEAD"), ("https", "GET"), ("http", "HEAD"), ("http", "GET"))
+
+psl = PublicSuffixList()
+_dns_cache: dict[str, tuple[float, bool]] = {}
+_winning: dict[str, tuple[str, str]] = {}
 
 def parse_args():
     ap = argparse.ArgumentParser()
@@ -23,63 +34,83 @@ def canon_host(s: str) -> str:
         h = h[4:]
     return h
 
-def dns_ok(host: str) -> bool:
-    try:
-        socket.getaddrinfo(host, None)
-        return True
-    except socket.gaierror:
-        return False
+async def resolve_all(resolver: aiohttp.AsyncResolver, names: list[str]) -> dict[str, bool]:
+    now = time.monotonic()
+    pending = [n for n in dict.fromkeys(names)
+               if n not in _dns_cache or now - _dns_cache[n][0] >= DNS_TTL]
+    found = await asyncio.gather(
+        *(resolver.resolve(n, family=socket.AF_UNSPEC) for n in pending),
+        return_exceptions=True,
+    )
+    for n, r in zip(pending, found):
+        _dns_cache[n] = (now, not isinstance(r, BaseException))
+    return {n: _dns_cache[n][1] for n in names}
 
-def try_root(session: requests.Session, host: str, timeout: int):
-    def _probe(h: str):
-        for scheme in ("https", "http"):
+async def request(session: aiohttp.ClientSession, method: str, url: str):
+    for attempt in range(2):
+        try:
+            async with session.request(method, url, allow_redirects=True) as r:
+                if r.status in RETRY_STATUS and attempt == 0:
+                    continue
+                return r.status, str(r.url)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == 0:
+                continue
+    return None, None
+
+async def try_root(session: aiohttp.ClientSession, dns: dict[str, bool], host: str):
+    async def _probe(h: str):
+        key = psl.get_sld(h) or h
+        order = list(ATTEMPTS)
+        if key in _winning:
+            order.remove(_winning[key]); order.insert(0, _winning[key])
+        https_up = False
+        for scheme, method in order:
+            if scheme == "http" and https_up:
+                continue
             root = f"{scheme}://{h}/"
-            try:
-                r = session.head(root, timeout=timeout, allow_redirects=True)
-            except requests.RequestException:
-                r = None
-            if r and (r.status_code in GOOD or r.status_code == 405):
-                return True, r.url or root, r.status_code
-            try:
-                g = session.get(root, timeout=timeout, allow_redirects=True)
-            except requests.RequestException:
-                g = None
-            if g and g.status_code in GOOD:
-                return True, g.url or root, g.status_code
+            code, final = await request(session, method, root)
+            if code is None:
+                continue
+            if scheme == "https":
+                https_up = True
+            if code in GOOD or (method == "HEAD" and code == 405):
+                _winning[key] = (scheme, method)
+                return True, final or root, code
         return False, f"Without valid response in https/http for {h}", None
 
-    if dns_ok(host):
-        ok, u, code = _probe(host)
+    if dns.get(host):
+        ok, u, code = await _probe(host)
         if ok: return True, u, code
 
     www = f"www.{host}"
-    if dns_ok(www):
-        ok, u, code = _probe(www)
+    if dns.get(www):
+        ok, u, code = await _probe(www)
         if ok: return True, u, code
 
     return False, "DNS does not resolve host nor www.", None
 
-def build_session(timeout: int) -> requests.Session:
-    from requests.adapters import HTTPAdapter
-    from urllib3.util.retry import Retry
-    retry = Retry(
-        total=1, connect=1, read=1,
-        status_forcelist=(429, 500, 502, 503, 504),
-        allowed_methods=("HEAD","GET"),
-        backoff_factor=0.3,
-        raise_on_status=False,
-        respect_retry_after_header=True,
-    )
-    s = requests.Session()
-    s.headers.update({
-        "User-Agent": "TFM-check/1.0 (+research; contact: you@example.com)",
-        "Accept": "*/*",
-    })
-    adapter = HTTPAdapter(max_retries=retry, pool_connections=64, pool_maxsize=64)
-    s.mount("https://", adapter); s.mount("http://", adapter)
-    return s
-
-def check_file(path: str, concurrency: int, timeout: int):
+async def run_all(hosts: list[str], concurrency: int, timeout: int):
+    resolver = aiohttp.AsyncResolver()
+    connector = aiohttp.TCPConnector(limit=concurrency, ttl_dns_cache=DNS_TTL, use_dns_cache=True, resolver=resolver)
+    sem = asyncio.Semaphore(concurrency)
+    dns = await resolve_all(resolver, hosts + [f"www.{h}" for h in hosts])
+
+    async with aiohttp.ClientSession(
+        connector=connector,
+        headers=HEADERS,
+        timeout=aiohttp.ClientTimeout(total=timeout),
+    ) as session:
+        async def probe(h):
+            async with sem:
+                ok, url_or_reason, code = await try_root(session, dns, h)
+            return (h, ok, url_or_reason, code)
+
+        results = await asyncio.gather(*(probe(h) for h in hosts))
+    await resolver.close()
+    return results
+
+def read_hosts(path: str) -> list[str]:
     with open(path, "r", encoding="utf-8", errors="ignore") as f:
         raw = [ln.strip() for ln in f if ln.strip()]
     hosts, seen = [], set()
@@ -87,42 +118,39 @@ def check_file(path: str, concurrency: int, timeout: int):
         h = canon_host(ln)
         if h and h not in seen:
             seen.add(h); hosts.append(h)
+    return hosts
 
-    session = build_session(timeout)
-    results = []
-
-    def worker(h):
-        ok, url_or_reason, code = try_root(session, h, timeout)
-        return (h, ok, url_or_reason, code)
-
-    with ThreadPoolExecutor(max_workers=concurrency) as ex:
-        futs = {ex.submit(worker, h): h for h in hosts}
-        for fut in as_completed(futs):
-            results.append(fut.result())
-
-    alive = [f"{url_or_reason.rstrip('/')}/" if ok else None for h, ok, url_or_reason, code in results if ok]
-    dead  = [h for h, ok, url_or_reason, code in results if not ok]
+def write_results(path: str, hosts: list[str], status: dict):
+    alive = sorted({f"{status[h][1].rstrip('/')}/" for h in hosts if status[h][0]})
+    dead  = [h for h in hosts if not status[h][0]]
+    dead.sort()
 
     alive_path = f"{path}_alive.txt"
     dead_path  = f"{path}_dead.txt"
     with open(alive_path, "w", encoding="utf-8") as fa:
-        for u in sorted(set(alive)):
-            fa.write(u + "\n")
+        fa.write("".join(u + "\n" for u in alive))
     with open(dead_path, "w", encoding="utf-8") as fd:
-        for h in sorted(set(dead)):
-            fd.write(h + "\n")
+        fd.write("".join(h + "\n" for h in dead))
 
-    ok_count = len(set(alive))
-    ko_count = len(set(dead))
+    ok_count = len(alive)
+    ko_count = len(dead)
     print(f"[{path}] OK: {ok_count} | FAIL: {ko_count} -> {alive_path} / {dead_path}")
 
 def main():
     args = parse_args()
+    file_hosts: dict[str, list[str]] = {}
     for p in args.files:
         try:
-            check_file(p, args.concurrency, args.timeout)
+            file_hosts[p] = read_hosts(p)
         except FileNotFoundError:
             print(f"[ERROR] Cannot find {p}", file=sys.stderr)
 
+    all_hosts = list(dict.fromkeys(h for hosts in file_hosts.values() for h in hosts))
+    results = asyncio.run(run_all(all_hosts, args.concurrency, args.timeout))
+    status = {h: (ok, url_or_reason, code) for h, ok, url_or_reason, code in results}
+
+    for p, hosts in file_hosts.items():
+        write_results(p, hosts, status)
+
 if __name__ == "__main__":
     main()
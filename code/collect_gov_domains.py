@@ -1,11 +1,18 @@
-import argparse, json, time, sys
+import argparse, gzip, json, time, sys
+from pathlib import Path
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable, Set, Dict
-import requests
+import requests, ijson, urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from publicsuffix2 import PublicSuffixList
 import dns.resolver, dns.exception
 
 HEADERS = {"User-Agent": "gov-domain-collector/1.0 (+https://example.local)"}
 CRT_URL = "https://crt.sh/?q=%25.{suffix}&output=json"
+CT_CACHE_DIR = Path(".ct_cache")  # overridden by --ct-cache
+CT_CACHE_TTL = 24 * 3600
 
 DEFAULT_SUFFIXES = {
     "gob_es": "gob.es",
@@ -19,27 +26,47 @@ DEFAULT_SUFFIXES = {
 
 psl = PublicSuffixList()
 
+# keep-alive to crt.sh across suffixes; the adapter is the only retry layer for
+# connection errors and 429/5xx, _download_ct_names only retries a broken stream
+session = requests.Session()
+session.headers.update(HEADERS)
+session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=8, max_retries=Retry(
+    total=4, backoff_factor=1.5, status_forcelist=[429, 500, 502, 503, 504])))
+
 def fetch_ct_names(suffix: str, retries: int = 4, backoff: float = 1.5) -> Set[str]:
+    cache = CT_CACHE_DIR / f"{suffix}.json.gz"
+    if cache.exists() and time.time() - cache.stat().st_mtime < CT_CACHE_TTL:
+        return set(json.loads(gzip.decompress(cache.read_bytes())))
+    names = _download_ct_names(suffix, retries, backoff)
+    CT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache.write_bytes(gzip.compress(json.dumps(sorted(names)).encode()))
+    return names
+
+def _download_ct_names(suffix: str, retries: int, backoff: float) -> Set[str]:
     url = CRT_URL.format(suffix=suffix)
+    dot_suffix = "." + suffix
     for attempt in range(1, retries + 1):
-        try:
-            r = requests.get(url, headers=HEADERS, timeout=60)
+        # status/connect failures were already retried by the adapter: let them propagate
+        with session.get(url, timeout=60, stream=True) as r:
             if r.status_code != 200:
                 raise RuntimeError(f"HTTP {r.status_code}")
-            data = r.json()
-            names = set()
-            for row in data:
-                raw = row.get("name_value", "")
-                for h in raw.split("\n"):
-                    h = h.strip().lower().lstrip("*.").rstrip(".")
-                    if h and h.endswith("." + suffix) or h == suffix:
-                        names.add(h)
-            return names
-        except Exception as e:
-            if attempt == retries:
-                raise
-            sleep = backoff ** attempt
-            time.sleep(sleep)
+            try:
+                # big suffixes return 100+ MB of JSON: parse name_value fields as they stream in
+                r.raw.decode_content = True
+                names = set()
+                for raw in ijson.items(r.raw, "item.name_value"):
+                    for h in (raw or "").split("\n"):
+                        # removeprefix, not lstrip: lstrip("*.") eats any leading run of '*' and '.'
+                        h = h.strip().lower().removeprefix("*.").strip(".")
+                        if h and (h.endswith(dot_suffix) or h == suffix):
+                            names.add(h)
+                return names
+            except (urllib3.exceptions.ProtocolError, urllib3.exceptions.ReadTimeoutError,
+                    requests.exceptions.ChunkedEncodingError, ijson.JSONError):
+                # connection dropped mid-body or truncated JSON
+                if attempt == retries:
+                    raise
+        time.sleep(backoff ** attempt)
     return set()
 
 def to_registrable(host: str) -> str:
@@ -50,9 +77,28 @@ def to_registrable(host: str) -> str:
     except Exception:
         return ""
 
-def is_delegated(domain: str, timeout: float = 3.0) -> bool:
+@lru_cache(maxsize=None)
+def _is_public_suffix(name: str) -> bool:
+    return psl.get_tld(name) == name
+
+def registrable_under(host: str, suffix: str) -> str:
+    # keep one label above the known suffix; only IDNs, the bare suffix and
+    # nested public suffixes (e.g. nsw.gov.au) go through the PSL
+    if host == suffix or not host.isascii():
+        return to_registrable(host)
+    cut = len(host) - len(suffix) - 1
+    reg = host[host.rfind(".", 0, cut) + 1:]
+    if reg != host and _is_public_suffix(reg):
+        return to_registrable(host)
+    return reg
+
+def make_resolver(timeout: float = 3.0) -> dns.resolver.Resolver:
     resolver = dns.resolver.Resolver()
     resolver.lifetime = timeout
+    return resolver
+
+def is_delegated(domain: str, timeout: float = 3.0, resolver: dns.resolver.Resolver | None = None) -> bool:
+    resolver = resolver or make_resolver(timeout)
     try:
         ans = resolver.resolve(domain, "NS")
         return len(ans) > 0
@@ -65,28 +111,34 @@ def is_delegated(domain: str, timeout: float = 3.0) -> bool:
     except (dns.resolver.Timeout, dns.exception.DNSException):
         return False
 
-def process_suffix(suffix: str, validate_dns: bool = True) -> Set[str]:
+def process_suffix(suffix: str, validate_dns: bool = True, dns_workers: int = 64) -> Set[str]:
     hosts = fetch_ct_names(suffix)
+    dot_suffix = "." + suffix
     registrable = set()
     for h in hosts:
-        reg = to_registrable(h)
-        if reg and (reg.endswith("." + suffix) or reg == suffix):
+        reg = registrable_under(h, suffix)
+        if reg and (reg.endswith(dot_suffix) or reg == suffix):
             registrable.add(reg)
     if validate_dns:
-        valid = set()
-        for d in registrable:
-            if is_delegated(d):
-                valid.add(d)
-        return valid
+        # lookups are network-bound: share one resolver across a thread pool
+        resolver = make_resolver()
+        doms = sorted(registrable)
+        with ThreadPoolExecutor(max_workers=max(1, dns_workers)) as pool:
+            ok = pool.map(lambda d: is_delegated(d, resolver=resolver), doms)
+            return {d for d, v in zip(doms, ok) if v}
     return registrable
 
 def main():
+    global CT_CACHE_DIR
     ap = argparse.ArgumentParser()
     ap.add_argument("--suffixes", nargs="*")
     ap.add_argument("--no-validate", action="store_true")
     ap.add_argument("--sleep", type=float, default=2.0)
+    ap.add_argument("--dns-workers", type=int, default=64)
     ap.add_argument("--outdir", default=".")
+    ap.add_argument("--ct-cache", help="directory for cached crt.sh names (default: <outdir>/.ct_cache)")
     args = ap.parse_args()
+    CT_CACHE_DIR = Path(args.ct_cache) if args.ct_cache else Path(args.outdir) / ".ct_cache"
 
     suffixes = args.suffixes if args.suffixes else list(DEFAULT_SUFFIXES.values())
 
@@ -97,7 +149,8 @@ def main():
         label = label_map.get(suf, suf.replace(".", "_"))
 
         try:
-            domains = process_suffix(suf, validate_dns=not args.no_validate)
+            domains = process_suffix(suf, validate_dns=not args.no_validate,
+                                     dns_workers=args.dns_workers)
             outpath = f"{args.outdir.rstrip('/')}/{label}.txt"
             with open(outpath, "w", encoding="utf-8") as f:
                 for d in sorted(domains):
@@ -1,23 +1,25 @@
-import json, re, argparse, pandas as pd, numpy as np
+import re, argparse, orjson, pandas as pd, numpy as np
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator
 
 TLD_GENERIC = re.compile(r"\.(com|net|io|ai|app|cloud|co|org|info)$", re.I)
 
-def load_ndjson(path: str) -> list[dict]:
-    with open(path, encoding="utf-8") as f:
-        return [json.loads(l) for l in f if l.strip()]
+def iter_ndjson(path: str) -> Iterator[dict]:
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield orjson.loads(line)
 
 def norm_domain(s):
     if not isinstance(s, str):
         return s
     s = s.strip().lower()
-    s = re.sub(r"^https?://", "", s)
-    s = s.split("/")[0]
-    s = s[4:] if s.startswith("www.") else s
-    return s
+    s = s[8:] if s.startswith("https://") else s.removeprefix("http://")
+    i = s.find("/")
+    s = s if i < 0 else s[:i]
+    return s.removeprefix("www.")
 
-def first_cookie_policy_details(docs: list[dict]) -> dict[str, dict]:
+def first_cookie_policy_details(docs: Iterable[dict]) -> dict[str, dict]:
     out = {}
     for d in docs:
         if d["doc_type"] == "COOKIE_POLICY":
@@ -26,48 +28,36 @@ def first_cookie_policy_details(docs: list[dict]) -> dict[str, dict]:
                 out[dom] = d["details"] or {}
     return out
 
-def ok_cookie_ownership(det: dict, tech: pd.Series) -> Optional[bool]:
-    own = det.get("ownership")
-    if own != "FIRST":
-        return None
-    return tech["cookies_3p_ratio"] == 0
-
-def ok_cookie_session_only(det: dict, tech: pd.Series) -> Optional[bool]:
-    dur = det.get("duration") or {}
-    if not (dur.get("session") and not dur.get("persistent")):
-        return None
-    return (tech["expiry_max_days"] or 0) <= 1
-
-def ok_consent_prior(consent_mech: str | None, tech: pd.Series) -> Optional[bool]:
-    if consent_mech not in {"banner", "cmp"}:
-        return None
-    return (tech["cookies_3p_ratio"] or 0) <= 0.05
-
-def ok_no_tracking_claim(det: dict, tech: pd.Series) -> Optional[bool]:
-    if det.get("third_parties"):
-        return None
-    return (tech["tracker_hit_ratio"] or 0) == 0
-
-def possible_transfer_violation(scope_norm: str | None, tech: pd.Series) -> Optional[bool]:
-    if scope_norm not in {"NONE", "INTRA_EU"}:
-        return None
-    v = tech.get("req_3p_top")
-    if v is None or (isinstance(v, float) and np.isnan(v)):
-        s = ""
-    else:
-        s = str(v)
-    top = [t.strip() for t in s.split(";") if t.strip()]
-    violates = any(TLD_GENERIC.search(d) for d in top)
-    return violates
+def _when(applies: pd.Series, value: pd.Series) -> pd.Series:
+    # nullable boolean: `value` where the rule applies, <NA> (unevaluable) elsewhere
+    return value.astype("boolean").where(applies.to_numpy(dtype=bool))
+
+def ok_cookie_ownership(ownership: pd.Series, tech: pd.DataFrame) -> pd.Series:
+    return _when(ownership.eq("FIRST"), tech["cookies_3p_ratio"].eq(0))
+
+def ok_cookie_session_only(session_only: pd.Series, tech: pd.DataFrame) -> pd.Series:
+    return _when(session_only, tech["expiry_max_days"].le(1))
+
+def ok_consent_prior(consent_mech: pd.Series, tech: pd.DataFrame) -> pd.Series:
+    return _when(consent_mech.isin(["banner", "cmp"]), tech["cookies_3p_ratio"].le(0.05))
+
+def ok_no_tracking_claim(declares_3p: pd.Series, tech: pd.DataFrame) -> pd.Series:
+    return _when(~declares_3p, tech["tracker_hit_ratio"].eq(0))
+
+def possible_transfer_violation(scope_norm: pd.Series, tech: pd.DataFrame) -> pd.Series:
+    # one regex pass over every top-3p entry, folded back per row by position
+    top = (tech["req_3p_top"].fillna("").astype(str).reset_index(drop=True)
+              .str.split(";").explode().str.strip())
+    hits = top.str.contains(TLD_GENERIC).groupby(level=0).any()
+    return _when(scope_norm.isin(["NONE", "INTRA_EU"]), pd.Series(hits.to_numpy(), index=tech.index))
 
 def main(policies_jsonl, domains_csv, tech_csv, out_csv):
 
-    docs  = load_ndjson(policies_jsonl)
-    cpol  = first_cookie_policy_details(docs)
+    cpol  = first_cookie_policy_details(iter_ndjson(policies_jsonl))
     df_pol= pd.read_csv(domains_csv)
-    df_pol["domain"] = df_pol["domain"].apply(norm_domain)
+    df_pol["domain"] = [norm_domain(x) for x in df_pol["domain"].to_numpy()]
     df_tech = pd.read_csv(tech_csv)
-    df_tech["domain"] = df_tech["domain"].apply(norm_domain)
+    df_tech["domain"] = [norm_domain(x) for x in df_tech["domain"].to_numpy()]
 
     def norm_scope(x: str|float):
         if not isinstance(x, str):
@@ -80,35 +70,29 @@ def main(policies_jsonl, domains_csv, tech_csv, out_csv):
         if "NONE" in x or "NINGUNA" in x:
             return "NONE"
         return pd.NA
-    df_pol["transfer_scope_norm"] = df_pol["transfer_scope"].apply(norm_scope)
+    df_pol["transfer_scope_norm"] = [norm_scope(x) for x in df_pol["transfer_scope"].to_numpy()]
 
     df = (df_pol
           .merge(df_tech, on="domain", how="left", suffixes=("", "_tech"))
           .set_index("domain"))
 
-    results = {
-        "ok_cookie_ownership": [],
-        "ok_cookie_session_only": [],
-        "ok_consent_prior": [],
-        "ok_no_tracking_claim": [],
-        "possible_transfer_violation": [],
-    }
-
-    for dom, row in df.iterrows():
-        det = cpol.get(dom, {})
-
-        results["ok_cookie_ownership"]      .append( ok_cookie_ownership(det, row) )
-        results["ok_cookie_session_only"]   .append( ok_cookie_session_only(det, row) )
-        results["ok_consent_prior"]         .append( ok_consent_prior(row.get("consent_mechanism"), row) )
-        results["ok_no_tracking_claim"]     .append( ok_no_tracking_claim(det, row) )
-        results["possible_transfer_violation"].append( possible_transfer_violation(row.get("transfer_scope_norm"), row) )
-
-    for k,v in results.items():
-        df[k] = v
-
-    bool_cols = list(results.keys())
-    df["matches"]     = df[bool_cols].apply(lambda r:(r==True ).sum(), axis=1)
-    df["violations"]  = df[bool_cols].apply(lambda r:(r==False).sum(), axis=1)
+    # cookie-policy claims per domain, broadcast to columns once
+    det = [cpol.get(dom, {}) for dom in df.index]
+    dur = [d.get("duration") or {} for d in det]
+    ownership    = pd.Series([d.get("ownership") for d in det], index=df.index, dtype=object)
+    session_only = pd.Series([bool(x.get("session") and not x.get("persistent")) for x in dur], index=df.index)
+    declares_3p  = pd.Series([bool(d.get("third_parties")) for d in det], index=df.index)
+
+    df["ok_cookie_ownership"]         = ok_cookie_ownership(ownership, df)
+    df["ok_cookie_session_only"]      = ok_cookie_session_only(session_only, df)
+    df["ok_consent_prior"]            = ok_consent_prior(df["consent_mechanism"], df)
+    df["ok_no_tracking_claim"]        = ok_no_tracking_claim(declares_3p, df)
+    df["possible_transfer_violation"] = possible_transfer_violation(df["transfer_scope_norm"], df)
+
+    bool_cols = ["ok_cookie_ownership", "ok_cookie_session_only", "ok_consent_prior",
+                 "ok_no_tracking_claim", "possible_transfer_violation"]
+    df["matches"]     = df[bool_cols].eq(True).sum(axis=1)
+    df["violations"]  = df[bool_cols].eq(False).sum(axis=1)
     df["unevaluable"] = df[bool_cols].isna().sum(axis=1)
 
     denom = df["matches"] + df["violations"]
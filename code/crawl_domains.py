@@ -0,0 +1,66 @@
+# domain helpers shared by the OpenWPM extract scripts (cookies, requests, security headers)
+import json, pathlib
+import numpy as np, pandas as pd, tldextract
+import pyarrow as pa, pyarrow.csv as pa_csv, pyarrow.parquet as pq
+from functools import lru_cache
+
+# bundled PSL snapshot: no network fetch, same suffixes on every run
+ext = tldextract.TLDExtract(include_psl_private_domains=True, suffix_list_urls=())
+
+# scheme://[userinfo@]host — what urlsplit().hostname would return
+HOST_RX = r"^[A-Za-z][A-Za-z0-9+.-]*://(?:[^@/?#]*@)?(\[[^\]/?#]*\]|[^:/?#]*)"
+
+VISIT_LUT_KEY = b"sqlite_source"
+
+def host_col(urls: pd.Series) -> pd.Series:
+    # NaN where the value is not a scheme://host URL
+    return urls.str.extract(HOST_RX, expand=False).str.lower().str.strip("[]")
+
+@lru_cache(maxsize=None)
+def regdom_or_host(h: str) -> str:
+    rd = ext(h).registered_domain or ""
+    return rd or h.lower().lstrip(".")
+
+def regdom_col(s: pd.Series) -> pd.Series:
+    # hosts repeat heavily across rows: resolve each distinct host once
+    s = s.fillna("").astype(str)
+    host = host_col(s)
+    host = host.where(host.notna() & host.ne(""), s)
+    lut = {h: regdom_or_host(h) if h else "" for h in pd.unique(host)}
+    return host.map(lut)
+
+def domains_differ(a: pd.Series, b: pd.Series) -> np.ndarray:
+    # one shared code table for both columns: the comparison is int vs int
+    codes, _ = pd.factorize(np.concatenate([a.to_numpy(), b.to_numpy()]))
+    return np.not_equal(codes[:len(a)], codes[len(a):]).astype(np.int8)
+
+def visit_fp_domains(con, db_path: pathlib.Path) -> dict[str, str]:
+    # site_url -> first-party domain, computed once per crawl database and kept in a
+    # parquet sidecar next to it, so each extract script reuses the other's lookup
+    side = db_path.with_name(db_path.name + ".fp_domains.parquet")
+    st = db_path.stat()
+    key = json.dumps({"size": st.st_size, "mtime_ns": st.st_mtime_ns}).encode()
+    try:
+        if side.exists() and (pq.read_schema(side).metadata or {}).get(VISIT_LUT_KEY) == key:
+            t = pq.read_table(side).to_pydict()
+            return dict(zip(t["site_url"], t["fp_domain"]))
+    except (OSError, pa.ArrowException):
+        pass
+    sites = pd.read_sql_query("SELECT DISTINCT COALESCE(site_url, '') AS site_url FROM site_visits", con)["site_url"]
+    lut = dict(zip(sites, regdom_col(sites)))
+    try:
+        table = pa.table({"site_url": list(lut), "fp_domain": list(lut.values())})
+        pq.write_table(table.replace_schema_metadata({VISIT_LUT_KEY: key}), side)
+    except (OSError, pa.ArrowException) as e:
+        print(f"[WARN] first-party lookup not cached ({side}): {e}")
+    return lut
+
+def write_csv_chunk(df: pd.DataFrame, fout, header: bool) -> None:
+    # Arrow's columnar CSV writer; mixed-type object columns (SQLite is loosely typed) fall back to pandas
+    try:
+        buf = pa.BufferOutputStream()
+        pa_csv.write_csv(pa.Table.from_pandas(df, preserve_index=False), buf,
+                         pa_csv.WriteOptions(include_header=header))
+        fout.write(buf.getvalue())
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        fout.write(df.to_csv(index=False, header=header).encode())
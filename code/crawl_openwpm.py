@@ -1,6 +1,6 @@
-import random, os, argparse
+import random, os, argparse, time
+from functools import partial
 from pathlib import Path
-from datetime import datetime
 from openwpm.command_sequence import CommandSequence
 from openwpm.commands.browser_commands import GetCommand
 from openwpm.config import BrowserParams, ManagerParams
@@ -67,14 +67,12 @@ browsers = [bp]
 
 def banner(msg): print(f"\n=== {msg} ===")
 
+def report(tgt: str, ok: bool):
+    print(f"[{time.strftime('%H:%M:%S')}] {tgt}  →  {'OK' if ok else 'FAIL'}")
+
 with TaskManager(mp, browsers, SQLiteStorageProvider(DB), None) as m:
     for rank, url in enumerate(sites):
-
-        def cb(ok: bool, tgt=url):
-            ts = datetime.now().strftime('%H:%M:%S')
-            print(f"[{ts}] {tgt}  →  {'OK' if ok else 'FAIL'}")
-
-        cs = CommandSequence(url, site_rank=rank, callback=cb)
+        cs = CommandSequence(url, site_rank=rank, callback=partial(report, url))
         cs.append_command(GetCommand(url=url, sleep=4), timeout=90)
         m.execute_command_sequence(cs)
 
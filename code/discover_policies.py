@@ -1,13 +1,16 @@
 from __future__ import annotations
 
-import argparse, re, sys, json
+import argparse, functools, re, sys, json, threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from urllib.parse import urljoin, urlparse, urlunparse, parse_qs, urlencode
 
 import requests
-from bs4 import BeautifulSoup
-from langdetect import detect, LangDetectException
+from lxml import html as lxml_html
+from lxml.etree import XPath, ParserError
+from langdetect import LangDetectException
+from langdetect.detector_factory import DetectorFactory, PROFILES_DIRECTORY
 from pydantic import BaseModel
 
 UA = (
@@ -15,11 +18,14 @@ UA = (
     "AppleWebKit/537.36 (KHTML, like Gecko) "
     "Chrome/124.0.0.0 Safari/537.36"
 )
+SAVE_HTML_WORKERS = 8
 
 LANG_ALIASES = {"es": ("es","es-es","es-mx","es-cl","español"),
   "en": ("en","en-gb","en-au","en-za","en-in","english"),
   "hi": ("hi","hi-in","hindi"),
   "ml": ("ml","ml-in","malayalam","മലയാളം"),}
+TLD_LANG = {".gob.es": "es", ".gob.mx": "es", ".gob.cl": "es",
+  ".gov.uk": "en", ".gov.au": "en", ".gov.za": "en"}
 
 
 KEYWORDS_BY_LANG: Dict[str, Dict[str, List[str]]] = {
@@ -47,12 +53,31 @@ KEYWORDS_BY_LANG: Dict[str, Dict[str, List[str]]] = {
 }
 
 DOC_PRIORITY = ("PRIVACY_POLICY", "COOKIE_POLICY", "DATA_PROTECTION", "LEGAL_NOTICE")
+DOC_RANK = {dt: i for i, dt in enumerate(DOC_PRIORITY)}
 
 ACTION_EXCLUDE_RX = re.compile(
     r"\b(acept(o|ar|a)|de\s+acuerdo|ok|entendido|continuar|cerrar|permitir|allow|accept|agree|yes|got\s*it|understood)\b",
     re.I | re.U
 )
 
+# Page-level prefilter: ASCII stems that every KEYWORDS_BY_LANG pattern contains
+# even when accents arrive as HTML entities ("t&eacute;rminos" still has "rmino").
+# Keep in sync with KEYWORDS_BY_LANG when adding keywords.
+ANY_KEYWORD_RX = re.compile(
+    r"priva|cookie|legal|rmino|condicion|protec|lopd|rgpd|gdpr|terms"
+    r"|गोपनीयता|कुकी|नियम|शर्तें|സ്വകാര്യത|കുക്കി",
+    re.I | re.U
+)
+
+_ONCLICK_HREF_RX = re.compile(r"location\.href\s*=\s*['\"](.*?)['\"]", re.I)
+_JS_NOOP_HREFS = frozenset({"#", "/", "#0", "#!", "#?", "javascript:;", "javascript:void(0)", "javascript:void(0);"})
+
+# str pages are re-encoded to UTF-8, so the parser must not trust <meta charset>
+_HTML_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+_LINK_XPATH = XPath("//a|//*[@role='link']|//button|//*[@role='button']")
+_TEXT_XPATH = XPath(".//text()")
+_PAGE_TEXT_XPATH = XPath("//text()[not(ancestor::script or ancestor::style)]")
+
 KEYWORD_URL_RX = re.compile(
     r"(privacy|privacidad|protecci[oó]n[-\s_]*de[-\s_]*datos|cookies?|legal|t[eé]rminos|terms|condiciones)",
     re.I | re.U
@@ -74,13 +99,21 @@ def build_accept_language(lang_grp: str) -> str:
         return "ml-IN,ml;q=0.9,en;q=0.8"
     return "en-GB,en;q=0.9,es;q=0.7"
 
+_http_local = threading.local()
+
+def _session() -> requests.Session:
+    sess = getattr(_http_local, "session", None)
+    if sess is None:
+        sess = _http_local.session = requests.Session()
+    return sess
+
 def fetch(url: str, lang_grp: str = "en", timeout: int = 20) -> Tuple[Optional[str], Optional[str], str]:
     headers = {
         "User-Agent": UA,
         "Accept-Language": build_accept_language(lang_grp),
     }
     try:
-        r = requests.get(url, timeout=timeout, headers=headers, allow_redirects=True)
+        r = _session().get(url, timeout=timeout, headers=headers, allow_redirects=True)
         if r.ok and "text/html" in r.headers.get("Content-Type", "").lower():
             return r.text, r.url, r.headers.get("Content-Type", "")
     except requests.RequestException:
@@ -97,22 +130,46 @@ def normalize_url(u: str) -> str:
     except Exception:
         return u.split("#", 1)[0]
 
-def detect_language_from_html(soup: BeautifulSoup, fallback_text: str = "") -> str:
+# the groups we classify plus close neighbours, so e.g. French text is not forced into es/en
+DETECT_PROFILES = ("en", "es", "hi", "ml", "pt", "fr")
+
+@functools.lru_cache(maxsize=1)
+def _detector_factory() -> DetectorFactory:
+    factory = DetectorFactory()
+    factory.load_json_profile([(Path(PROFILES_DIRECTORY) / code).read_text(encoding="utf-8")
+                               for code in DETECT_PROFILES])
+    factory.set_seed(0)
+    return factory
+
+def _detect(text: str) -> str:
+    # fresh Detector per call: nothing carries over between pages
+    d = _detector_factory().create()
+    d.append(text)
+    return d.detect()
+
+def detect_language_from_html(tree: lxml_html.HtmlElement | None, fallback_text: str = "", url: str = "") -> str:
     declared = ""
-    if soup and soup.html:
-        declared = (soup.html.get("lang") or soup.html.get("xml:lang") or "").strip().lower()
-    if not declared:
-        meta = soup.find("meta", attrs={"http-equiv": lambda v: v and v.lower() == "content-language"})
-        if meta:
-            declared = (meta.get("content") or "").split(",")[0].strip().lower()
+    if tree is not None:
+        declared = (tree.get("lang") or tree.get("xml:lang") or "").strip().lower()
+        if not declared:
+            meta = next((m for m in tree.iter("meta")
+                         if (m.get("http-equiv") or "").lower() == "content-language"), None)
+            if meta is not None:
+                declared = (meta.get("content") or "").split(",")[0].strip().lower()
 
     for grp, aliases in LANG_ALIASES.items():
         if declared and any(declared.startswith(a) for a in aliases):
             return grp
 
-    text = fallback_text or (soup.get_text(" ", strip=True)[:2000] if soup else "")
+    host = urlparse(url).hostname or ""
+    for suffix, grp in TLD_LANG.items():
+        if host.endswith(suffix):
+            return grp
+
+    text = (fallback_text or (" ".join(t.strip() for t in _PAGE_TEXT_XPATH(tree) if t.strip())
+                              if tree is not None else ""))[:2000]
     try:
-        guess = detect(text) if text else ""
+        guess = _detect(text) if text else ""
     except LangDetectException:
         guess = ""
     for grp, aliases in LANG_ALIASES.items():
@@ -120,38 +177,51 @@ def detect_language_from_html(soup: BeautifulSoup, fallback_text: str = "") -> s
             return grp
     return "en"
 
-def patterns_for_lang(lang_grp: str) -> Dict[str, List[re.Pattern]]:
-    pats = {}
-    for doc_type, lst in KEYWORDS_BY_LANG.get(lang_grp, {}).items():
-        pats[doc_type] = [re.compile(p, re.I | re.U) for p in lst]
-    return pats
+@functools.lru_cache(maxsize=8)
+def patterns_for_lang(lang_grp: str) -> Tuple[Tuple[str, re.Pattern], ...]:
+    # one alternation per doc_type, in DOC_PRIORITY order: the first type that
+    # matches anywhere wins, same as collecting every hit and ranking them
+    kw = KEYWORDS_BY_LANG.get(lang_grp, {})
+    return tuple((dt, re.compile("|".join(f"(?:{p})" for p in kw[dt]), re.I | re.U))
+                 for dt in DOC_PRIORITY if kw.get(dt))
+
+_PATTERNS_EN = patterns_for_lang("en")
 
 def classify_src(src: str, lang_grp: str) -> Optional[str]:
-    pats = patterns_for_lang(lang_grp)
-    hits = set()
-    for dt in pats:
-        if any(rx.search(src) for rx in pats[dt]):
-            hits.add(dt)
-    if not hits:
-        pats_en = patterns_for_lang("en")
-        for dt in pats_en:
-            if any(rx.search(src) for rx in pats_en[dt]):
-                hits.add(dt)
-    for dt in DOC_PRIORITY:
-        if dt in hits:
+    for dt, rx in patterns_for_lang(lang_grp):
+        if rx.search(src):
             return dt
+    if lang_grp != "en":
+        for dt, rx in _PATTERNS_EN:
+            if rx.search(src):
+                return dt
     return None
 
-def fetch_render(url: str, lang_grp: str = "en", timeout: int = 30) -> Tuple[Optional[str], Optional[str]]:
-    try:
-        from playwright.sync_api import sync_playwright, TimeoutError as PWTimeout
-    except Exception:
-        return None, None
-
-    with sync_playwright() as pw:
-        browser = pw.chromium.launch(headless=True, args=["--no-sandbox"])
-        page = browser.new_page(extra_http_headers={"Accept-Language": build_accept_language(lang_grp)})
+# One headless Chromium for the whole run, with a fresh context per page. Sync
+# Playwright objects are bound to the thread that created them, so the browser
+# lives on a dedicated single-thread executor that discovery workers submit to.
+class _RenderPool:
+    def __init__(self):
+        self._exec = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render")
+        self._pw = None
+        self._browser = None
+
+    def __enter__(self) -> "_RenderPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _render(self, url: str, lang_grp: str, timeout: int) -> Tuple[Optional[str], Optional[str]]:
+        if self._browser is None or not self._browser.is_connected():
+            # first render, or Chromium died: (re)launch instead of failing every later page
+            if self._pw is None:
+                from playwright.sync_api import sync_playwright
+                self._pw = sync_playwright().start()
+            self._browser = self._pw.chromium.launch(headless=True, args=["--no-sandbox"])
+        ctx = self._browser.new_context(extra_http_headers={"Accept-Language": build_accept_language(lang_grp)})
         try:
+            page = ctx.new_page()
             page.goto(url, wait_until="load", timeout=timeout * 1000)
             try:
                 page.wait_for_load_state("networkidle", timeout=15000)
@@ -159,52 +229,103 @@ def fetch_render(url: str, lang_grp: str = "en", timeout: int = 30) -> Tuple[Opt
                 pass
             page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
             page.wait_for_timeout(1200)
-            html = page.content()
-            final = page.url
+            return page.content(), page.url
         except Exception:
-            html, final = None, None
-        browser.close()
-        return html, final
+            return None, None
+        finally:
+            ctx.close()
+
+    def render(self, url: str, lang_grp: str = "en", timeout: int = 30) -> Tuple[Optional[str], Optional[str]]:
+        return self._exec.submit(self._render, url, lang_grp, timeout).result()
+
+    def _close(self) -> None:
+        if self._browser is not None and self._browser.is_connected():
+            self._browser.close()
+        if self._pw is not None:
+            self._pw.stop()
+        self._browser = self._pw = None
+
+    def close(self) -> None:
+        self._exec.submit(self._close).result()
+        self._exec.shutdown()
+
+_RENDER_POOL: _RenderPool | None = None
+_render_lock = threading.Lock()
+
+def _render_pool() -> _RenderPool:
+    global _RENDER_POOL
+    with _render_lock:
+        if _RENDER_POOL is None:
+            _RENDER_POOL = _RenderPool()
+        return _RENDER_POOL
+
+def close_render_pool() -> None:
+    # called from main() while executors still accept work; atexit runs too late
+    global _RENDER_POOL
+    with _render_lock:
+        if _RENDER_POOL is not None:
+            _RENDER_POOL.close()
+            _RENDER_POOL = None
+
+def fetch_render(url: str, lang_grp: str = "en", timeout: int = 30) -> Tuple[Optional[str], Optional[str]]:
+    try:
+        import playwright.sync_api  # noqa: F401
+    except Exception:
+        return None, None
+    try:
+        return _render_pool().render(url, lang_grp, timeout)
+    except Exception:
+        return None, None
 
 
+def _save_html(rec: LinkRecord, save_html_dir: Path) -> None:
+    body, final_url, ctype = fetch(rec.url, rec.lang or "en")
+    if body:
+        dest = save_html_dir / rec.domain / rec.doc_type
+        dest.mkdir(parents=True, exist_ok=True)
+        fname = (urlparse(final_url or rec.url).path.strip("/") or "index").replace("/", "_") + ".html"
+        (dest / fname).write_text(body, encoding="utf-8")
+
 def extract_links_and_candidates(base_url: str, html: str, lang_grp: str, save_html_dir: Optional[Path], domain: str, debug: bool=False) -> List[LinkRecord]:
-    soup = BeautifulSoup(html, "lxml")
-    text_for_lang = soup.get_text(" ", strip=True)[:4000] if soup else ""
-    lang = detect_language_from_html(soup, text_for_lang) or lang_grp
+    if not (ANY_KEYWORD_RX.search(html) or ANY_KEYWORD_RX.search(base_url)):
+        if debug:
+            print(f"- no policy keywords on page ({domain})")
+        return []
+    try:
+        tree = lxml_html.document_fromstring(html.encode("utf-8", "replace"), parser=_HTML_PARSER)
+    except ParserError:
+        return []
+    lang = detect_language_from_html(tree, url=base_url) or lang_grp
 
-    seen_urls = set()
+    seen_urls: Dict[str, int] = {}
     records: List[LinkRecord] = []
 
-    def maybe_add(abs_url: str, anchor_text: str, lang_guess: str, src: str):
-        if not abs_url.lower().startswith(("http://", "https://")):
+    def maybe_add(abs_url_norm: str, anchor_text: str, lang_guess: str, src: str):
+        if not abs_url_norm.lower().startswith(("http://", "https://")):
             return
-        abs_url_norm = normalize_url(abs_url)
-        if abs_url_norm in seen_urls:
+        prev = seen_urls.get(abs_url_norm)
+        if prev is not None and records[prev].doc_type == DOC_PRIORITY[0]:
             return
         doc_type = classify_src(src, lang_guess)
         if not doc_type:
             return
-        seen_urls.add(abs_url_norm)
         rec = LinkRecord(domain=domain, url=abs_url_norm, doc_type=doc_type,
                          anchor_text=anchor_text or None, lang=lang_guess)
-        records.append(rec)
-
-        if save_html_dir:
-            body, final_url, ctype = fetch(abs_url_norm, lang_guess)
-            if body:
-                dest = save_html_dir / domain / doc_type
-                dest.mkdir(parents=True, exist_ok=True)
-                fname = (urlparse(final_url or abs_url_norm).path.strip("/") or "index").replace("/", "_") + ".html"
-                (dest / fname).write_text(body, encoding="utf-8")
+        if prev is None:
+            seen_urls[abs_url_norm] = len(records)
+            records.append(rec)
+        elif DOC_RANK[doc_type] < DOC_RANK[records[prev].doc_type]:
+            # same URL reached again through a link that names a higher-priority doc type
+            records[prev] = rec
 
     parsed_base = urlparse(base_url)
     base_root = f"{parsed_base.scheme}://{parsed_base.netloc}/"
 
-    for el in soup.select("a, [role=link], button, [role=button]"):
+    for el in _LINK_XPATH(tree):
         href = el.get("href") or el.get("data-href") or ""
         if not href:
             onclick = (el.get("onclick") or "").strip()
-            m = re.search(r"location\.href\s*=\s*['\"](.*?)['\"]", onclick, re.I)
+            m = _ONCLICK_HREF_RX.search(onclick)
             if m:
                 href = m.group(1)
 
@@ -212,7 +333,7 @@ def extract_links_and_candidates(base_url: str, html: str, lang_grp: str, save_h
         if not href:
             continue
 
-        anchor = " ".join(el.stripped_strings).strip()
+        anchor = " ".join(t.strip() for t in _TEXT_XPATH(el) if t.strip())
         aria = (el.get("aria-label") or "").strip()
         title = (el.get("title") or "").strip()
         label  = (anchor or aria or title or "").strip()
@@ -222,15 +343,14 @@ def extract_links_and_candidates(base_url: str, html: str, lang_grp: str, save_h
 
         low = href.lower()
         if (not href or
-            low in {"#", "/", "#0", "#!", "#?","javascript:;", "javascript:void(0)", "javascript:void(0);"} or
+            low in _JS_NOOP_HREFS or
             low.startswith("javascript:")):
             continue
 
         if low.startswith(("mailto:", "tel:", "callto:")):
             continue
 
-        abs_url = urljoin(base_url, href)
-        abs_url_norm = normalize_url(abs_url)
+        abs_url_norm = normalize_url(urljoin(base_url, href))
 
         if abs_url_norm.rstrip("/") == base_root.rstrip("/"):
             if not (href.startswith("#") and KEYWORD_URL_RX.search(href)):
@@ -245,6 +365,11 @@ def extract_links_and_candidates(base_url: str, html: str, lang_grp: str, save_h
 
         maybe_add(abs_url_norm, label, lang, src)
 
+    if save_html_dir and records:
+        # policy pages are fetched after the link scan, several at a time
+        with ThreadPoolExecutor(max_workers=SAVE_HTML_WORKERS) as pool:
+            list(pool.map(lambda rec: _save_html(rec, save_html_dir), records))
+
     if debug:
         print(f"- {len(records)} detected links ({domain}, lang={lang})")
     return records
@@ -287,6 +412,7 @@ def main():
     ap.add_argument("--output", required=True)
     ap.add_argument("--save-html")
     ap.add_argument("--render", action="store_true")
+    ap.add_argument("--workers", type=int, default=16)
     ap.add_argument("--debug", action="store_true")
     ns = ap.parse_args()
 
@@ -294,24 +420,32 @@ def main():
     out_path.parent.mkdir(parents=True, exist_ok=True)
     save_dir = Path(ns.save_html) if ns.save_html else None
 
-    total = 0
-    with out_path.open("w", encoding="utf-8") as fout, open(ns.domains, encoding="utf-8") as fdom:
-        for i, line in enumerate(fdom, 1):
-            dom = line.strip();
-            if not dom or dom.startswith("#"):
-                continue
+    with open(ns.domains, encoding="utf-8") as fdom:
+        domains = [(i, dom) for i, line in enumerate(fdom, 1)
+                   if (dom := line.strip()) and not dom.startswith("#")]
+
+    def discover_one(item: Tuple[int, str]) -> List[LinkRecord]:
+        i, dom = item
+        if ns.debug:
+            print(f"[{i}] {dom}")
+        try:
+            return discover_for_domain(dom, save_dir, ns.render, ns.debug)
+        except Exception as e:
             if ns.debug:
-                print(f"[{i}] {dom}")
-            try:
-                records = discover_for_domain(dom, save_dir, ns.render, ns.debug)
-            except Exception as e:
-                if ns.debug:
-                    print(f"ERROR discover {dom}: {e}", file=sys.stderr)
-                records = []
-
-            for rec in records:
-                fout.write(json.dumps(rec.model_dump(), ensure_ascii=False) + "\n")
-                total += 1
+                print(f"ERROR discover {dom}: {e}", file=sys.stderr)
+            return []
+
+    # network-bound: fan domains out over threads, write results in input order
+    total = 0
+    try:
+        with out_path.open("w", encoding="utf-8") as fout, \
+                ThreadPoolExecutor(max_workers=max(1, ns.workers)) as pool:
+            for records in pool.map(discover_one, domains):
+                for rec in records:
+                    fout.write(json.dumps(rec.model_dump(), ensure_ascii=False) + "\n")
+                    total += 1
+    finally:
+        close_render_pool()
 
     print(f"OK {total} links --> {out_path}")
 
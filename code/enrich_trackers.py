@@ -15,18 +15,17 @@ def main():
     ap.add_argument("--out",     required=True)
     args = ap.parse_args()
 
-    df  = pd.read_csv(args.input)
+    df  = pd.read_csv(args.input, engine="pyarrow")
     map = pd.read_csv(args.mapping)
 
     dom_col = find_domain_col(df)
     df["__dom"]  = df[dom_col].str.lower().fillna("")
     map["__dom"] = map["domain"].str.lower()
 
-    out = df.merge(
-        map[["__dom", "owner", "categ", "default", "prevalence", "fingerprinting"]],
-        on="__dom",
-        how="left"
-    ).drop(columns="__dom")
+    # one row per tracker domain, then a single hash probe per input row
+    lookup = (map.drop_duplicates("__dom").set_index("__dom")
+                 [["owner", "categ", "default", "prevalence", "fingerprinting"]])
+    out = df.join(lookup, on="__dom").drop(columns="__dom")
 
     out.to_csv(args.out, index=False)
     hits = out["owner"].notna().sum()
@@ -1,24 +1,19 @@
-import sqlite3, pandas as pd, tldextract, argparse, pathlib, sys
-from urllib.parse import urlsplit
-
-ext = tldextract.TLDExtract(include_psl_private_domains=True)
-
-def parse_expiry(x):
-    try:
-        if pd.isna(x): return pd.NaT
-        if isinstance(x, (int, float)) or (isinstance(x, str) and x.isdigit()):
-            return pd.to_datetime(int(float(x)), unit="s", utc=True, errors="coerce")
-        return pd.to_datetime(str(x), utc=True, errors="coerce")
-    except Exception:
-        return pd.NaT
-
-def regdom_or_host(u):
-    try:
-        h = urlsplit(u).hostname or u
-    except Exception:
-        h = u
-    rd = ext(h).registered_domain or ""
-    return rd or h.lower().lstrip(".")
+import sqlite3, pandas as pd, argparse, pathlib, sys
+from crawl_domains import regdom_col, domains_differ, visit_fp_domains, write_csv_chunk
+
+CHUNK_ROWS = 100_000
+COLS = ["visit_id", "host", "name", "value", "path",
+        "is_session", "is_secure", "is_http_only", "same_site", "expiry",
+        "first_party", "cookie_domain", "fp_domain", "is_third_party"]
+
+def parse_expiry(s: pd.Series) -> pd.Series:
+    # epoch seconds (numbers or digit strings) in one pass, the rest as date strings
+    num = pd.to_numeric(s, errors="coerce")
+    out = pd.to_datetime(num // 1, unit="s", utc=True, errors="coerce")
+    rest = num.isna() & s.notna()
+    if rest.any():
+        out.loc[rest] = pd.to_datetime(s[rest].astype(str), utc=True, errors="coerce", format="mixed")
+    return out
 
 def main():
     p = argparse.ArgumentParser()
@@ -30,33 +25,34 @@ def main():
     if not DB.exists():
         sys.exit(f"ERROR SQLite not found: {DB}")
 
-    with sqlite3.connect(DB) as con:
-        df = pd.read_sql_query("""
-            SELECT visit_id, host, name, value, path,
-                   is_session, is_secure, is_http_only,
-                   same_site, expiry
-            FROM javascript_cookies
-        """, con)
-
-        sites = pd.read_sql_query("""
-            SELECT visit_id, site_url FROM site_visits
-        """, con).set_index("visit_id")["site_url"].to_dict()
-
-    df["first_party"] = df["visit_id"].map(sites)
-    df["first_party"] = df["first_party"].fillna("")
-
-    df["expiry"] = df["expiry"].apply(parse_expiry)
-
-    for col in ("cookie_domain", "fp_domain"):
-        df[col] = ""
-
-    df["cookie_domain"] = df["host"].apply(lambda h: regdom_or_host(h))
-    df["fp_domain"]     = df["first_party"].apply(lambda u: regdom_or_host(u) if u else "")
-
-    df["is_third_party"] = (df["cookie_domain"] != df["fp_domain"]).astype(int)
-
-    df.to_csv(args.out, index=False)
-    print(f"OK CSV cookies --> {args.out}  ({len(df):,} rows)")
+    out = pathlib.Path(args.out)
+    n = 0
+    # join in SQLite and stream fixed-size chunks so the cookie table never sits in memory whole
+    with sqlite3.connect(DB) as con, out.open("wb") as fout:
+        con.execute("PRAGMA mmap_size=30000000000")
+        con.execute("PRAGMA cache_size=-200000")
+        fp_lut = visit_fp_domains(con, DB)
+        chunks = pd.read_sql_query("""
+            SELECT c.visit_id, c.host, c.name, c.value, c.path,
+                   c.is_session, c.is_secure, c.is_http_only,
+                   c.same_site, c.expiry,
+                   COALESCE(v.site_url, '') AS first_party
+            FROM javascript_cookies c
+            LEFT JOIN site_visits v ON v.visit_id = c.visit_id
+        """, con, chunksize=CHUNK_ROWS)
+
+        for df in chunks:
+            df["expiry"] = parse_expiry(df["expiry"])
+            df["cookie_domain"] = regdom_col(df["host"])
+            df["fp_domain"]     = df["first_party"].map(fp_lut).fillna("")
+            df["is_third_party"] = domains_differ(df["cookie_domain"], df["fp_domain"])
+
+            write_csv_chunk(df[COLS], fout, header=(n == 0))
+            n += len(df)
+        if n == 0:
+            fout.write((",".join(COLS) + "\n").encode())
+
+    print(f"OK CSV cookies --> {args.out}  ({n:,} rows)")
 
 if __name__ == "__main__":
     main()
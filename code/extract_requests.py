@@ -1,8 +1,9 @@
 import sqlite3
 import pandas as pd
-import argparse, sys, pathlib, tldextract, textwrap
+import argparse, sys, pathlib, textwrap
+from crawl_domains import regdom_col, domains_differ, visit_fp_domains, write_csv_chunk
 
-ext = tldextract.TLDExtract(include_psl_private_domains=True)
+CHUNK_ROWS = 100_000
 
 def detect_tp_column(cursor) -> str | None:
     cols = {row[1] for row in cursor.execute("PRAGMA table_info(http_requests)")}
@@ -15,21 +16,13 @@ def detect_tp_column(cursor) -> str | None:
             return cand
     return None
 
-def regdom_or_host_from_url(u):
-    try:
-        h = urlsplit(u).hostname or u
-    except Exception:
-        h = u
-    rd = ext(h).registered_domain or ""
-    return rd or h.lower().lstrip(".")
-
 def main() -> None:
-    pa = argparse.ArgumentParser(
+    ap = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
     )
-    pa.add_argument("--sqlite", required=True)
-    pa.add_argument("--out", required=True)
-    args = pa.parse_args()
+    ap.add_argument("--sqlite", required=True)
+    ap.add_argument("--out", required=True)
+    args = ap.parse_args()
 
     db_path = pathlib.Path(args.sqlite).expanduser()
     if not db_path.exists():
@@ -42,42 +35,29 @@ def main() -> None:
     if not tp_col:
         sys.exit("ERROR Could not find column")
 
-    req = pd.read_sql_query(
+    # one joined query, streamed in chunks: neither table is loaded whole into pandas.
+    # data:/blob: URIs have no host to attribute, so they never leave SQLite
+    cur.execute("PRAGMA mmap_size=30000000000")
+    cur.execute("PRAGMA cache_size=-200000")
+    fp_lut = visit_fp_domains(con, db_path)
+    chunks = pd.read_sql_query(
         f"""
-        SELECT id AS request_id,
-               visit_id,
-               url,
-               referrer,
-               resource_type,
-               {tp_col} AS is_third_party
-        FROM   http_requests
+        SELECT r.visit_id,
+               COALESCE(v.site_url, '') AS first_party,
+               r.url,
+               r.resource_type,
+               resp.response_status AS status,
+               r.referrer,
+               r.{tp_col} AS is_third_party
+        FROM   http_requests r
+        LEFT JOIN http_responses resp ON resp.request_id = r.id
+        LEFT JOIN site_visits v       ON v.visit_id = r.visit_id
+        WHERE  r.url NOT LIKE 'data:%' AND r.url NOT LIKE 'blob:%'
         """,
         con,
+        chunksize=CHUNK_ROWS,
     )
 
-    resp = pd.read_sql_query(
-        """
-        SELECT request_id,
-               response_status AS status
-        FROM   http_responses
-        """,
-        con,
-    )
-
-    visits = pd.read_sql_query(
-        "SELECT visit_id, site_url FROM site_visits", con
-    ).set_index("visit_id")["site_url"]
-
-    con.close()
-
-    df = req.merge(resp, on="request_id", how="left")
-    df["first_party"] = df["visit_id"].map(visits).fillna("")
-
-    df["req_domain"] = df["url"].apply(regdom_or_host_from_url)
-    df["fp_domain"]  = df["first_party"].apply(regdom_or_host_from_url)
-
-    df["is_third_party_dom"] = (df["req_domain"] != df["fp_domain"]).astype(int)
-
     cols_final = [
         "visit_id",
         "first_party",
@@ -92,8 +72,20 @@ def main() -> None:
     ]
     out_path = pathlib.Path(args.out)
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_path, index=False, columns=cols_final)
-    print(f"OK CSV requests --> {out_path}  ({len(df):,} rows)")
+
+    n = 0
+    with out_path.open("wb") as fout:
+        for df in chunks:
+            df["req_domain"] = regdom_col(df["url"])
+            df["fp_domain"]  = df["first_party"].map(fp_lut).fillna("")
+            df["is_third_party_dom"] = domains_differ(df["req_domain"], df["fp_domain"])
+
+            write_csv_chunk(df[cols_final], fout, header=(n == 0))
+            n += len(df)
+        if n == 0:
+            fout.write((",".join(cols_final) + "\n").encode())
+    con.close()
+    print(f"OK CSV requests --> {out_path}  ({n:,} rows)")
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 from __future__ import annotations
-import argparse, sqlite3, json, pathlib, re, urllib.parse as up
-import pandas as pd
+import argparse, sqlite3, json, pathlib, re
+import numpy as np, pandas as pd
+from crawl_domains import host_col
 
 SEC_HEADERS = [
     "strict-transport-security",
@@ -34,19 +35,41 @@ def parse_raw_headers(raw: str | None) -> dict[str, str]:
     return out
 
 
-def header_present(hdr_dict: dict[str, str], name: str) -> int:
-    if name in hdr_dict:
-        return 1
-    if name == "permissions-policy" and "feature-policy" in hdr_dict:
-        return 1
-    return 0
+def _header_rx(name: str) -> tuple[re.Pattern, re.Pattern]:
+    n = re.escape(name)
+    # raw "Name: value" lines, and [name, value] pairs in OpenWPM's JSON list form
+    # (an unescaped `["` can only open a pair, never sit inside a JSON string)
+    return (re.compile(rf"^\s*{n}\s*:", re.I | re.M),
+            re.compile(rf'\[\s*"{n}"\s*,', re.I))
 
+_HEADER_RX = {h: _header_rx(h) for h in SEC_HEADERS + ["feature-policy"]}
 
-def fqdn_from_url(url: str) -> str:
-    try:
-        return (up.urlparse(url).hostname or "").lower()
-    except Exception:
-        return ""
+
+def header_flags(headers: pd.Series) -> pd.DataFrame:
+    raw = headers.fillna("").astype(str)
+    head = raw.str.lstrip().str[:1]
+    is_list, is_dict = head.eq("["), head.eq("{")
+    is_text = ~(is_list | is_dict)
+
+    found = {}
+    for h, (line_rx, pair_rx) in _HEADER_RX.items():
+        hit = np.zeros(len(raw), bool)
+        hit[is_text.to_numpy()] = raw[is_text].str.contains(line_rx).to_numpy(dtype=bool)
+        hit[is_list.to_numpy()] = raw[is_list].str.contains(pair_rx).to_numpy(dtype=bool)
+        found[h] = hit
+
+    flags = pd.DataFrame(found, index=raw.index)
+    # dict-shaped JSON is rare: keep the full parser for it
+    if is_dict.any():
+        parsed = raw[is_dict].map(parse_raw_headers)
+        for h in _HEADER_RX:
+            flags.loc[is_dict, h] = parsed.map(lambda d, x=h: x in d)
+    flags["permissions-policy"] |= flags.pop("feature-policy")
+    return flags[SEC_HEADERS].astype("int8")
+
+
+def fqdn_col(urls: pd.Series) -> pd.Series:
+    return host_col(urls).fillna("")
 
 
 def main() -> None:
@@ -56,23 +79,26 @@ def main() -> None:
     ap.add_argument("--out",      required=True)
     args = ap.parse_args()
 
-    rq = pd.read_csv(args.requests)
+    rq = pd.read_csv(args.requests, engine="pyarrow", usecols=["url", "resource_type"],
+                     dtype={"resource_type": "category"})
 
-    main_docs = (
-        rq[rq["resource_type"].str.lower().isin(["main_frame", "document"])]
-        [["url"]].drop_duplicates()
-    )
-    main_docs["fqdn"] = main_docs["url"].apply(fqdn_from_url)
+    # lowercase the handful of categories, not every row
+    rt = rq["resource_type"]
+    doc_types = rt.cat.categories[rt.cat.categories.str.lower().isin(["main_frame", "document"])]
+    main_docs = rq.loc[rt.isin(doc_types), ["url"]].drop_duplicates()
+    main_docs["fqdn"] = fqdn_col(main_docs["url"])
 
+    # let SQLite do the join: one scan of http_responses probing a keyed temp
+    # table, so only main-document responses ever reach pandas
     conn = sqlite3.connect(args.db)
-    resp = pd.read_sql_query("SELECT url, headers FROM http_responses", conn)
+    conn.execute("CREATE TEMP TABLE main_docs_tmp (url TEXT PRIMARY KEY)")
+    conn.executemany("INSERT INTO main_docs_tmp VALUES (?)", ((u,) for u in main_docs["url"]))
+    resp = pd.read_sql_query(
+        "SELECT r.url, r.headers FROM http_responses r JOIN main_docs_tmp m ON r.url = m.url", conn)
     conn.close()
 
     merged = main_docs.merge(resp, on="url", how="left")
-    merged["_hdr_dict"] = merged["headers"].apply(parse_raw_headers)
-
-    for h in SEC_HEADERS:
-        merged[h] = merged["_hdr_dict"].apply(lambda d, x=h: header_present(d, x))
+    merged[SEC_HEADERS] = header_flags(merged["headers"])
 
     cols = SEC_HEADERS
     sec = (
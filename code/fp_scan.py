@@ -1,4 +1,5 @@
-import asyncio, json, argparse, random
+import asyncio, json, argparse, random, os
+import multiprocessing as mp
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -9,11 +10,15 @@ from playwright.async_api import async_playwright
 JS_SNIPPET = """
 // === Pre-Page-Load instrumentation ===
 window.__FP_FLAGS = {canvas:false,audioCtx:false,rtc:false,storage:false};
+// push each flag to Python the first time it flips
+const _flag = k=>{
+    if (!window.__FP_FLAGS[k]){ window.__FP_FLAGS[k] = true; window.report_fp?.(k); }
+};
 
 // Canvas
 const origToDataURL = HTMLCanvasElement.prototype.toDataURL;
 HTMLCanvasElement.prototype.toDataURL = function(){
-    window.__FP_FLAGS.canvas = true;
+    _flag('canvas');
     return origToDataURL.apply(this, arguments);
 };
 
@@ -23,7 +28,7 @@ HTMLCanvasElement.prototype.toDataURL = function(){
   if (proto && proto.start){
       const orig = proto.start;
       proto.start = function(){
-          window.__FP_FLAGS.audioCtx = true;
+          _flag('audioCtx');
           return orig.apply(this, arguments);
       };
   }
@@ -33,7 +38,7 @@ HTMLCanvasElement.prototype.toDataURL = function(){
 const origRTCPeer = window.RTCPeerConnection;
 if (origRTCPeer){
   window.RTCPeerConnection = function(...args){
-      window.__FP_FLAGS.rtc = true;
+      _flag('rtc');
       return new origRTCPeer(...args);
   }
 }
@@ -42,25 +47,34 @@ if (origRTCPeer){
 ['localStorage','sessionStorage'].forEach(store=>{
   const origSet = Storage.prototype.setItem;
   Storage.prototype.setItem = function(k,v){
-      window.__FP_FLAGS.storage = true;
+      _flag('storage');
       return origSet.call(this,k,v);
   };
 });
+
+// Hosts contacted by the page, read once after load
+window.__FP_HOSTS = new Set();
+const _addHost = u=>{ try { window.__FP_HOSTS.add(new URL(u, location.href).hostname) } catch(e){} };
+const origFetch = window.fetch;
+window.fetch = function(u, ...rest){
+    _addHost(u instanceof Request ? u.url : u);
+    return origFetch.call(this, u, ...rest);
+};
+new PerformanceObserver(list=>list.getEntries().forEach(e=>_addHost(e.name)))
+    .observe({type:'resource', buffered:true});
 """
 
+FP_FLAGS = ("canvas", "audioCtx", "rtc", "storage")
+
 def _to_url_and_host(target: str):
     s = target.strip()
     url = s if s.startswith(("http://","https://")) else f"https://{s}"
     host = (urlparse(url).hostname or "").lower()
     return url, host
 
-async def scan_domain(page, target, timeout):
+async def scan_domain(page, target, timeout, fp_seen):
     url, main_host = _to_url_and_host(target)
-
-    third_party = set()
-    page.on("request", lambda r: third_party.add(urlparse(r.url).hostname or ""))
-
-    await page.add_init_script(JS_SNIPPET)
+    fp_seen.pop(page, None)
 
     try:
         resp = await page.goto(url, timeout=timeout*1000)
@@ -69,7 +83,9 @@ async def scan_domain(page, target, timeout):
         return {"domain": main_host or target, "status": f"ERROR {e}"}
 
     cookies = await page.context.cookies()
-    fp_flags = await page.evaluate("window.__FP_FLAGS")
+    flagged = fp_seen.pop(page, set())
+    fp_flags = {k: k in flagged for k in FP_FLAGS}
+    third_party = await page.evaluate("Array.from(window.__FP_HOSTS)")
 
     tps = sorted({h for h in third_party if h and h != main_host})
 
@@ -89,29 +105,78 @@ async def scan_domain(page, target, timeout):
         **fp_flags
     }
 
-async def main_async(args):
-    domains = [d.strip() for d in Path(args.input).read_text().splitlines() if d.strip()]
-    out_dir = Path(args.output); out_dir.mkdir(parents=True, exist_ok=True)
-
-    sem = asyncio.Semaphore(args.workers)
+async def main_async(domains, out_dir, workers, timeout, position=0):
     results = []
 
-    async with async_playwright() as p:
-        browser = await p.firefox.launch(headless=True)
-        context = await browser.new_context(ignore_https_errors=True)
+    # this shard's OK results, one line per domain as it finishes
+    with open(out_dir / f"fp_scans.{position}.jsonl", "w", encoding="utf-8") as part:
+        async with async_playwright() as p:
+            browser = await p.firefox.launch(headless=True)
+            context = await browser.new_context(ignore_https_errors=True)
+
+            # page -> flags reported by its frames during the current scan
+            fp_seen = {}
+            async def on_fp(source, key):
+                fp_seen.setdefault(source["page"], set()).add(key)
+            await context.expose_binding("report_fp", on_fp)
 
-        async def worker(domain):
-            async with sem:
+            async def new_page():
                 page = await context.new_page()
-                res = await scan_domain(page, domain, args.timeout)
-                await page.close()
+                await page.add_init_script(JS_SNIPPET)
+                return page
+
+            # pre-warmed tabs, reused across domains; the queue bounds concurrency
+            pool = asyncio.Queue()
+            for page in await asyncio.gather(*(new_page() for _ in range(workers))):
+                pool.put_nowait(page)
+
+            async def worker(domain):
+                page = await pool.get()
+                try:
+                    res = await scan_domain(page, domain, timeout, fp_seen)
+                except Exception as e:
+                    # post-load failures (e.g. context destroyed by a redirect) must not kill the shard
+                    res = {"domain": _to_url_and_host(domain)[1] or domain, "status": f"ERROR {e}"}
+                finally:
+                    try:
+                        await page.goto("about:blank")
+                    except Exception:
+                        await page.close()
+                        page = await new_page()
+                    pool.put_nowait(page)
                 if res["status"] == "OK":
-                    safe_name = res["domain"].replace(".", "_")
-                    jpath = out_dir / f"{safe_name}.json"
-                    jpath.write_text(json.dumps(res, indent=2, ensure_ascii=False))
+                    part.write(json.dumps(res, ensure_ascii=False) + "\n")
+                    part.flush()
                 results.append(res)
 
-        await tqdm.gather(*(worker(d) for d in domains))
+            await tqdm.gather(*(worker(d) for d in domains), position=position)
+
+    return results
+
+def _scan_shard(job):
+    return asyncio.run(main_async(*job))
+
+def main(args):
+    domains = [d.strip() for d in Path(args.input).read_text().splitlines() if d.strip()]
+    out_dir = Path(args.output); out_dir.mkdir(parents=True, exist_ok=True)
+
+    # one browser per process, each crawling an interleaved shard of the list;
+    # shards write their own fp_scans.<i>.jsonl as they go, merged at the end
+    procs = max(1, min(args.procs, len(domains)))
+    tabs = max(1, args.workers // procs)
+    jobs = [(domains[i::procs], out_dir, tabs, args.timeout, i) for i in range(procs)]
+    if procs == 1:
+        results = _scan_shard(jobs[0])
+    else:
+        with mp.get_context("spawn").Pool(procs) as pool:
+            results = [r for part in pool.map(_scan_shard, jobs) for r in part]
+
+    # full per-domain results in one NDJSON file rather than one file per domain
+    with open(out_dir / "fp_scans.jsonl", "wb") as f:
+        for i in range(procs):
+            part = out_dir / f"fp_scans.{i}.jsonl"
+            f.write(part.read_bytes())
+            part.unlink()
 
     df = pd.DataFrame(results)
     df.to_csv(out_dir / "summary_fp.csv", index=False)
@@ -120,8 +185,9 @@ if __name__ == "__main__":
     ap = argparse.ArgumentParser()
     ap.add_argument("-i","--input", required=True)
     ap.add_argument("-o","--output")
-    ap.add_argument("-w","--workers", type=int, default=4)
+    ap.add_argument("-w","--workers", type=int, default=16, help="open tabs, split across --procs")
+    ap.add_argument("-p","--procs", type=int, default=max(1, min(4, (os.cpu_count() or 2) // 2)))
     ap.add_argument("-t","--timeout", type=int, default=40)
     args = ap.parse_args()
-    asyncio.run(main_async(args))
+    main(args)
     print(f"OK FP-scan finished --> {args.output}/summary_fp.csv")
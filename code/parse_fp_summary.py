@@ -1,4 +1,4 @@
-import pandas as pd, ast, argparse, pathlib
+import pandas as pd, numpy as np, ast, argparse, pathlib
 
 ap = argparse.ArgumentParser()
 ap.add_argument("--summary", required=True)
@@ -13,11 +13,12 @@ rename = {"canvas":"fp_canvas",
           "storage":"fp_storage"}
 df = df.rename(columns=rename)
 
-for col in rename.values():
-    df[col] = df[col].astype(bool).astype(int)
+# failed scans have no flags: count them as not detected
+cols = list(rename.values())
+df[cols] = df[cols].fillna(False).to_numpy().astype(bool).astype(np.int8)
 
-df["fp_methods_total"] = df[list(rename.values())].sum(axis=1)
-df["fp_detected"]      = (df["fp_methods_total"] > 0).astype(int)
+df["fp_methods_total"] = df[cols].sum(axis=1).astype(np.int8)
+df["fp_detected"]      = (df["fp_methods_total"] > 0).astype(np.int8)
 
 keep = ["domain","fp_detected","fp_methods_total",
         "fp_canvas","fp_audioCtx","fp_rtc","fp_storage",
@@ -1,9 +1,15 @@
-import json, csv, pathlib, argparse, re, datetime as dt
+import csv, pathlib, argparse, re, datetime as dt
+import orjson
+from multiprocessing import Pool
+
+WEAK_PAT = re.compile(r"RC4|3DES|DES|NULL|EXPORT|MD5|PSK|ADH|ANON", re.I)
+IS_FS   = ("ECDHE", "DHE")
+TLS13_OK = ("TLS_AES_", "TLS_CHACHA20_")
 
 def flatten(path: pathlib.Path) -> dict:
     domain = path.stem.replace("_", ".")
     try:
-        data = json.loads(path.read_text())
+        data = orjson.loads(path.read_bytes())
         res = data["server_scan_results"][0]
         scan = res.get("scan_result", {})
 
@@ -38,10 +44,6 @@ def flatten(path: pathlib.Path) -> dict:
                 if "ECDHE" in name or "DHE" in name:
                     suites_fs.append(name)
 
-        WEAK_PAT = re.compile(r"RC4|3DES|DES|NULL|EXPORT|MD5|PSK|ADH|ANON", re.I)
-        IS_FS   = ("ECDHE", "DHE")
-        TLS13_OK = ("TLS_AES_", "TLS_CHACHA20_")
-
         weak = [
             s for s in suites
             if (
@@ -98,7 +100,10 @@ def main():
     ap.add_argument("--out", required=True)
     args = ap.parse_args()
 
-    rows = [flatten(p) for p in pathlib.Path(args.indir).glob("*.json")]
+    # one independent, CPU-bound parse per file: spread them over all cores
+    paths = sorted(pathlib.Path(args.indir).glob("*.json"))
+    with Pool() as pool:
+        rows = list(pool.imap(flatten, paths, chunksize=32))
     cols = [
         "domain", "tls_error", "tls_version_max", "tls_key_alg", "tls_key_size",
         "tls_curve", "tls_cert_issuer", "tls_days_until_expiry",
@@ -8,8 +8,6 @@ from typing import Dict, Tuple
 import numpy as np
 import pandas as pd
 
-import re
-
 SECURITY_HEADERS = [
     "strict-transport-security",
     "content-security-policy",
@@ -26,9 +24,40 @@ VIOLATION_COLS = {
 
 ROBUST_METRICS = ["cookies_total", "tracker_hit_ratio", "total_sec_headers"]
 
+# summary key -> (column, aggregation), in output order
+SUMMARY_SPEC = {
+    "pct_privacy_policy": ("has_privacy", "mean"),
+    "pct_cookie_policy": ("has_cookies", "mean"),
+    "pct_legal_notice": ("has_legal", "mean"),
+    "pct_data_protect_clause": ("has_data_prot", "mean"),
+    "pct_controller_present": ("privacy_controller_present", "mean"),
+    "pct_dpo_contact": ("dpo_contact_present", "mean"),
+    "rights_pct_mean": ("rights_pct", "mean"),
+    "rights_pct_std": ("rights_pct", "std"),
+    "pct_has_legal_basis": ("has_legal_basis", "mean"),
+    "pct_has_retention": ("retention_present", "mean"),
+    "pct_has_recipients": ("has_recipients", "mean"),
+
+    "cookies_total_mean": ("cookies_total", "mean"),
+    "cookies_3p_ratio_mean": ("cookies_3p_ratio", "mean"),
+    "cookies_session_ratio_mean": ("cookies_session_ratio", "mean"),
+    "tracker_hit_ratio_mean": ("tracker_hit_ratio", "mean"),
+    "req_3p_ratio_mean": ("req_3p_ratio", "mean"),
+
+    "total_sec_headers_mean": ("total_sec_headers", "mean"),
+    "security_score_mean": ("security_score", "mean"),
+    **{f"pct_{h}": (h, "mean") for h in SECURITY_HEADERS},
+    "tls_days_until_expiry_median": ("tls_days_until_expiry", "median"),
+    "tls_cipher_fs_ratio_mean": ("tls_cipher_fs_ratio", "mean"),
+    "tls_cipher_weak_ratio_mean": ("tls_cipher_weak_ratio", "mean"),
+
+    "compliance_score_mean": ("compliance_score", "mean"),
+    "possible_transfer_violation_pct": ("possible_transfer_violation", "mean"),
+}
+
 def load_data(data_dir: Path) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     try:
-        domains = pd.read_csv(data_dir / "domains_agg.csv")
+        domains = pd.read_csv(data_dir / "domains_agg.csv", dtype={"consent_mechanism": "category"})
         master = pd.read_csv(data_dir / "master_dataset.csv")
         compliance = pd.read_csv(data_dir / "compliance_report.csv")
     except FileNotFoundError as e:
@@ -37,21 +66,19 @@ def load_data(data_dir: Path) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]
     return domains, master, compliance
 
 
-def norm_domain(s: str) -> str:
-    if not isinstance(s, str):
-        return s
-    s = s.strip().lower()
-    s = re.sub(r"^https?://", "", s)
-    s = s.split("/")[0]
-    s = s[4:] if s.startswith("www.") else s
-    return s
+def norm_domain(s: pd.Series) -> pd.Series:
+    # non-strings (NaN) pass through as NaN, like the scalar version
+    return (s.str.strip().str.lower()
+             .str.replace(r"^https?://", "", regex=True)
+             .str.split("/", n=1).str[0]
+             .str.removeprefix("www."))
 
 def build_domain_metrics(
     domains: pd.DataFrame, master: pd.DataFrame, compliance: pd.DataFrame) -> pd.DataFrame:
 
-    domains["domain"]    = domains["domain"].apply(norm_domain)
-    master["domain"]     = master["domain"].apply(norm_domain)
-    compliance["domain"] = compliance["domain"].apply(norm_domain)
+    domains["domain"]    = norm_domain(domains["domain"])
+    master["domain"]     = norm_domain(master["domain"])
+    compliance["domain"] = norm_domain(compliance["domain"])
 
     d_cols = [
         "domain",
@@ -111,46 +138,32 @@ def build_domain_metrics(
 
 def summarise_dataset(df: pd.DataFrame) -> Dict[str, float]:
 
-    summary = {
-
-        "pct_privacy_policy": df["has_privacy"].mean(),
-        "pct_cookie_policy": df["has_cookies"].mean(),
-        "pct_legal_notice": df["has_legal"].mean(),
-        "pct_data_protect_clause": df["has_data_prot"].mean(),
-        "pct_controller_present": df["privacy_controller_present"].mean(),
-        "pct_dpo_contact": df["dpo_contact_present"].mean(),
-        "rights_pct_mean": df["rights_pct"].mean(),
-        "rights_pct_std": df["rights_pct"].std(ddof=0),
-        "pct_has_legal_basis": (df["legal_bases_sum"] > 0).mean(),
-        "pct_has_retention": df["retention_present"].mean(),
-        "pct_has_recipients": (df["recipients_sum"] > 0).mean(),
-
-        "cookies_total_mean": df["cookies_total"].mean(),
-        "cookies_3p_ratio_mean": df["cookies_3p_ratio"].mean(),
-        "cookies_session_ratio_mean": df["cookies_session_ratio"].mean(),
-        "tracker_hit_ratio_mean": df["tracker_hit_ratio"].mean(),
-        "req_3p_ratio_mean": df["req_3p_ratio"].mean(),
-
-        "total_sec_headers_mean": df["total_sec_headers"].mean(),
-        "security_score_mean": df["security_score"].mean(),
-        **{f"pct_{h}": df[h].mean() for h in SECURITY_HEADERS},
-        "tls_days_until_expiry_median": df["tls_days_until_expiry"].median(),
-        "tls_cipher_fs_ratio_mean": df["tls_cipher_fs_ratio"].mean(),
-        "tls_cipher_weak_ratio_mean": df["tls_cipher_weak_ratio"].mean(),
-
-        "compliance_score_mean": df["compliance_score"].mean(),
-        "possible_transfer_violation_pct": df["possible_transfer_violation"].mean(),
+    df = df.assign(has_legal_basis=df["legal_bases_sum"] > 0,
+                   has_recipients=df["recipients_sum"] > 0)
+
+    # one reduction per aggregator over all of its columns
+    by_agg: Dict[str, list] = {}
+    for col, agg in SUMMARY_SPEC.values():
+        by_agg.setdefault(agg, []).append(col)
+    stats = {
+        "mean": df[by_agg["mean"]].mean(),
+        "median": df[by_agg["median"]].median(),
+        "std": df[by_agg["std"]].std(ddof=0),
     }
+    summary = {key: stats[agg][col] for key, (col, agg) in SUMMARY_SPEC.items()}
 
+    ok = df[[c for c in df.columns if c.startswith("ok_")]]
+    for col, n in (ok == False).sum().items():
+        label = VIOLATION_COLS.get(col, col.removeprefix("ok_"))
+        summary[f"violation_{label}_count"] = int(n)
 
-    for col in [c for c in df.columns if c.startswith("ok_")]:
-        label = VIOLATION_COLS.get(col, col.replace("ok_", ""))
-        summary[f"violation_{label}_count"] = (df[col] == False).sum()
-
+    robust = df[ROBUST_METRICS]
+    q = robust.quantile([0.25, 0.5, 0.75])
+    mean, std = robust.mean(), robust.std(ddof=0)
     for metric in ROBUST_METRICS:
-        summary[f"{metric}_median"] = df[metric].median()
-        summary[f"{metric}_iqr"] = df[metric].quantile(0.75) - df[metric].quantile(0.25)
-        cv = df[metric].std(ddof=0) / (df[metric].mean() or 1)
+        summary[f"{metric}_median"] = q.at[0.5, metric]
+        summary[f"{metric}_iqr"] = q.at[0.75, metric] - q.at[0.25, metric]
+        cv = std[metric] / (mean[metric] or 1)
         summary[f"{metric}_cv"] = cv
         summary[f"{metric}_high_cv"] = cv > 1
 
@@ -159,8 +172,11 @@ def summarise_dataset(df: pd.DataFrame) -> Dict[str, float]:
 
 
 def summarise_consent(df: pd.DataFrame) -> pd.Series:
-    df["consent_mechanism"] = df["consent_mechanism"].fillna("unknown")
-    return df["consent_mechanism"].value_counts(normalize=True, dropna=False)
+    cm = df["consent_mechanism"]
+    if cm.isna().any():
+        cm = cm.cat.set_categories(cm.cat.categories.union(["unknown"])).fillna("unknown")
+    df["consent_mechanism"] = cm
+    return cm.value_counts(normalize=True, dropna=False)
 
 
 def _json_serial(obj):
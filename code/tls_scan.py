@@ -1,6 +1,5 @@
 from __future__ import annotations
-import argparse, csv, socket, subprocess, sys, textwrap, time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import argparse, asyncio, csv, subprocess, sys, textwrap, time
 from pathlib import Path
 from urllib.parse import urlsplit
 
@@ -16,19 +15,33 @@ SCAN_OPTS = [
     "--quiet",
 ]
 
-def port_open(host: str, port: int = 443, timeout: int = 3) -> bool:
+async def port_open(host: str, port: int = 443, timeout: int = 3) -> bool:
     try:
-        with socket.create_connection((host, port), timeout=timeout):
-            return True
-    except (socket.timeout, OSError):
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (asyncio.TimeoutError, OSError):
         return False
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return True
 
 def slug(host: str) -> str:
     return host.replace(".", "_").replace(":", "_")
 
-def run_cmd(cmd: list[str], timeout: int) -> tuple[int, str]:
-    r = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
-    return r.returncode, r.stderr.strip()
+async def run_cmd(cmd: list[str], timeout: int) -> tuple[int, str]:
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE)
+    try:
+        _, err = await asyncio.wait_for(proc.communicate(), timeout)
+    except BaseException as ex:
+        proc.kill()
+        await proc.wait()
+        if isinstance(ex, asyncio.TimeoutError):
+            raise subprocess.TimeoutExpired(cmd, timeout) from None
+        raise
+    return proc.returncode, err.decode(errors="replace").strip()
 
 def host_from_line(s: str) -> str:
     s = s.strip()
@@ -47,8 +60,16 @@ def host_from_line(s: str) -> str:
 
     return h.split(":")[0]
 
-def scan_domain(domain: str, timeout: int, http_headers: bool) -> tuple[str,str|None,str]:
-    if not port_open(domain, 443, timeout=5):
+async def _attempt(base: list[str], target: list[str], outfile: Path, timeout: int) -> bool:
+    rc, err = await run_cmd([*base, "--json_out", str(outfile), *target], timeout)
+    if rc == 0 and outfile.exists() and outfile.stat().st_size > 0:
+        return True
+    outfile.unlink(missing_ok=True)
+    return False
+
+async def scan_domain(domain: str, timeout: int, http_headers: bool,
+                      sem: asyncio.Semaphore | None = None) -> tuple[str,str|None,str]:
+    if not await port_open(domain, 443, timeout=5):
         return "NOP", None, "port 443 closed"
 
     outfile = TLS_DIR / f"{slug(domain)}.json"
@@ -56,25 +77,56 @@ def scan_domain(domain: str, timeout: int, http_headers: bool) -> tuple[str,str|
     base = ["sslyze", *SCAN_OPTS]
     if http_headers:
         base.append("--http_headers")
-    base += ["--json_out", str(outfile)]
 
-    attempts: list[list[str]] = [
-        base + [domain]
+    if await _attempt(base, [domain], outfile, timeout):
+        return "OK", outfile.name, ""
+    if domain.startswith("www."):
+        return "ERR", None, "sslyze failed"
+
+    fallbacks = [
+        (["--sni", f"www.{domain}", domain], outfile.with_name(outfile.name + ".sni.part")),
+        ([f"www.{domain}"],                  outfile.with_name(outfile.name + ".www.part")),
     ]
-    if not domain.startswith("www."):
-        attempts += [
-            base + ["--sni", f"www.{domain}", domain],
-            base + [f"www.{domain}"],
-        ]
-
-    for cmd in attempts:
-        rc, err = run_cmd(cmd, timeout)
-        if rc == 0 and outfile.exists() and outfile.stat().st_size > 0:
-            return "OK", outfile.name, ""
-        outfile.unlink(missing_ok=True)
+    # apex failed. The plain-www scan runs alongside --sni only when a second
+    # worker slot is free right now, so --workers still caps sslyze processes;
+    # otherwise the fallbacks run one after the other, --sni first
+    if sem is None or sem.locked():
+        for target, _ in fallbacks:
+            if await _attempt(base, target, outfile, timeout):
+                return "OK", outfile.name, ""
+        return "ERR", None, "sslyze failed"
+
+    await sem.acquire()  # a permit is free: does not wait
+    tasks = [asyncio.create_task(_attempt(base, target, out, timeout)) for target, out in fallbacks]
+    try:
+        # --sni is still preferred when both succeed
+        for task, (_, out) in zip(tasks, fallbacks):
+            if await task:
+                out.replace(outfile)
+                return "OK", outfile.name, ""
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for _, out in fallbacks:
+            out.unlink(missing_ok=True)
+        sem.release()
 
     return "ERR", None, "sslyze failed"
 
+async def scan_all(domains: list[str], workers: int, timeout: int, http_headers: bool):
+    sem = asyncio.Semaphore(workers)
+
+    async def bounded(dom: str):
+        async with sem:
+            try:
+                return dom, await scan_domain(dom, timeout, http_headers, sem)
+            except Exception as ex:
+                return dom, ("ERR", None, f"exception: {ex}")
+
+    for fut in asyncio.as_completed([bounded(d) for d in domains]):
+        yield await fut
+
 def parse_args() -> argparse.Namespace:
     p = argparse.ArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -101,15 +153,9 @@ def main() -> None:
     ok = err = nop = 0
     rows: list[tuple[str,str,str,str]] = []
 
-    with ThreadPoolExecutor(max_workers=args.workers) as pool:
-        futs = {pool.submit(scan_domain,d,args.timeout,not args.no_http): d for d in domains}
-        for fut in as_completed(futs):
-            dom = futs[fut]
-            try:
-                status, jfile, reason = fut.result()
-            except Exception as ex:
-                status, jfile, reason = "ERR", None, f"exception: {ex}"
-
+    async def run() -> None:
+        nonlocal ok, err, nop
+        async for dom, (status, jfile, reason) in scan_all(domains, args.workers, args.timeout, not args.no_http):
             pad = dom.ljust(35)
             if status == "OK":
                 ok  += 1;  print(f"[ OK ] {pad} → {jfile}")
@@ -120,6 +166,8 @@ def main() -> None:
 
             rows.append((dom,status,jfile or "",reason))
 
+    asyncio.run(run())
+
     with SUMMARY_CSV.open("w",newline="",encoding="utf-8") as fh:
         csv.writer(fh).writerows([["domain","status","json_file","reason"], *rows])
 